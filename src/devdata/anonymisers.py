@@ -1,29 +1,99 @@
+import json
 import random
 
-from .utils import get_exported_pks_for_model
+from .utils import get_exported_pk_index
+
+
+def anonymise_many(anonymiser, *, objs, field, pii_values, **kwargs):
+    """
+    Anonymise a column of values, using the anonymiser's `batch` interface
+    when it provides one and calling it once per value otherwise.
+    """
+    batch = getattr(anonymiser, "batch", None)
+    if batch is not None:
+        return batch(objs=objs, field=field, pii_values=pii_values, **kwargs)
+
+    return [
+        anonymiser(obj=obj, field=field, pii_value=pii_value, **kwargs)
+        for obj, pii_value in zip(objs, pii_values)
+    ]
+
+
+def prepare_anonymiser(anonymiser, *, model, field, dest):
+    """
+    Get the anonymiser to use for a field of a model for the duration of an
+    export, using the anonymiser's `prepare` interface when it provides one.
+    """
+    prepare = getattr(anonymiser, "prepare", None)
+    if prepare is None:
+        return anonymiser
+    return prepare(model=model, field=field, dest=dest)
 
 
 def faker_anonymise(
     generator, *args, preserve_nulls=False, unique=False, **kwargs
 ):
+    def get_generator(fake):
+        return getattr(fake.unique if unique else fake, generator)
+
     def anonymise(*, pii_value, fake, **_kwargs):
         if preserve_nulls and pii_value is None:
             return None
 
-        faker_generator = getattr(fake.unique if unique else fake, generator)
-        return faker_generator(*args, **kwargs)
+        return get_generator(fake)(*args, **kwargs)
 
+    def anonymise_batch(*, pii_values, fake, **_kwargs):
+        faker_generator = get_generator(fake)
+        return [
+            None
+            if preserve_nulls and pii_value is None
+            else faker_generator(*args, **kwargs)
+            for pii_value in pii_values
+        ]
+
+    anonymise.batch = anonymise_batch
+    if not unique:
+        # Identifies the values this anonymiser generates, for deterministic
+        # anonymisation. Unique values depend on what has already been
+        # generated, so can't be derived from the original value alone.
+        anonymise.cache_key = "faker_anonymise:{}".format(
+            json.dumps([generator, args, kwargs, preserve_nulls], default=repr)
+        )
     return anonymise
 
 
 def preserve_internal(alternative):
-    def anonymise(obj, field, pii_value, **kwargs):
-        if getattr(obj, "is_superuser", False) or getattr(
+    def is_internal(obj):
+        return getattr(obj, "is_superuser", False) or getattr(
             obj, "is_staff", False
-        ):
+        )
+
+    def anonymise(obj, field, pii_value, **kwargs):
+        if is_internal(obj):
             return pii_value
         return alternative(obj=obj, field=field, pii_value=pii_value, **kwargs)
 
+    def anonymise_batch(*, objs, field, pii_values, **kwargs):
+        values = list(pii_values)
+        external = [
+            index for index, obj in enumerate(objs) if not is_internal(obj)
+        ]
+        replacements = anonymise_many(
+            alternative,
+            objs=[objs[index] for index in external],
+            field=field,
+            pii_values=[values[index] for index in external],
+            **kwargs,
+        )
+        for index, replacement in zip(external, replacements):
+            values[index] = replacement
+        return values
+
+    anonymise.batch = anonymise_batch
+    if hasattr(alternative, "prepare"):
+        anonymise.prepare = lambda **kwargs: preserve_internal(
+            prepare_anonymiser(alternative, **kwargs),
+        )
     return anonymise
 
 
@@ -33,10 +103,61 @@ def const(value, preserve_nulls=False):
             return None
         return value
 
+    def anonymise_batch(*, pii_values, **_kwargs):
+        if not preserve_nulls:
+            return [value] * len(pii_values)
+        return [None if x is None else value for x in pii_values]
+
+    anonymise.batch = anonymise_batch
     return anonymise
 
 
+class RandomPkSampler:
+    """
+    Draws random primary keys from those exported for a model, in constant
+    time per draw.
+    """
+
+    def __init__(self, pks):
+        self.pks = pks
+
+    def sample(self):
+        return random.choice(self.pks)
+
+    def sample_many(self, count):
+        return random.choices(self.pks, k=count)
+
+
+def get_random_pk_sampler(dest, model, field):
+    related_model = model._meta.get_field(field).related_model
+    return RandomPkSampler(get_exported_pk_index(dest, related_model))
+
+
 def random_foreign_key(obj, field, dest, **_kwargs):
-    related_model = obj._meta.get_field(field).related_model
-    exported_pks = get_exported_pks_for_model(dest, related_model)
-    return random.choice(exported_pks)
+    return get_random_pk_sampler(dest, obj.__class__, field).sample()
+
+
+def random_foreign_key_batch(objs, field, dest, **_kwargs):
+    if not objs:
+        return []
+    sampler = get_random_pk_sampler(dest, objs[0].__class__, field)
+    return sampler.sample_many(len(objs))
+
+
+def prepare_random_foreign_key(*, model, field, dest):
+    # Look up the related model and its exported primary keys once per export,
+    # rather than for every value.
+    sampler = get_random_pk_sampler(dest, model, field)
+
+    def anonymise(**_kwargs):
+        return sampler.sample()
+
+    def anonymise_batch(*, objs, **_kwargs):
+        return sampler.sample_many(len(objs))
+
+    anonymise.batch = anonymise_batch
+    return anonymise
+
+
+random_foreign_key.batch = random_foreign_key_batch
+random_foreign_key.prepare = prepare_random_foreign_key
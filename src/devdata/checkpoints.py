@@ -0,0 +1,150 @@
+"""
+Checkpoints recording the progress of an import in the database being imported
+to, so that a failed import can be resumed.
+"""
+
+import threading
+from typing import Dict, Tuple
+
+from django.db import connections
+
+CHECKPOINT_TABLE = "devdata_import_checkpoint"
+
+# The label under which extra strategies are recorded.
+EXTRAS_LABEL = "<extras>"
+
+
+class StrategyCheckpoint:
+    """
+    The progress of importing the data for a single strategy.
+    """
+
+    def __init__(self, checkpoint, app_model_label, key):
+        self.checkpoint = checkpoint
+        self.app_model_label = app_model_label
+        self.key = key
+
+    @property
+    def rows(self) -> int:
+        return self.checkpoint.get_progress(self.app_model_label, self.key)[0]
+
+    @property
+    def complete(self) -> bool:
+        return self.checkpoint.get_progress(self.app_model_label, self.key)[1]
+
+    def record_rows(self, rows: int) -> None:
+        """
+        Record the number of rows imported so far. This should be called in
+        the same transaction as the rows are imported in.
+        """
+        self.checkpoint.set_progress(
+            self.app_model_label,
+            self.key,
+            rows,
+            False,
+        )
+
+    def mark_complete(self) -> None:
+        self.checkpoint.set_progress(
+            self.app_model_label,
+            self.key,
+            self.rows,
+            True,
+        )
+
+
+class ImportCheckpoint:
+    """
+    The progress of an import, stored in a table in the database being
+    imported to so that it's updated transactionally with the imported data.
+    """
+
+    def __init__(self, django_dbname: str) -> None:
+        self.django_dbname = django_dbname
+        self.progress: Dict[Tuple[str, str], Tuple[int, bool]] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def connection(self):
+        # Connections are per-thread, so this must be looked up on each use.
+        return connections[self.django_dbname]
+
+    def exists(self) -> bool:
+        return CHECKPOINT_TABLE in self.connection.introspection.table_names()
+
+    @property
+    def table(self) -> str:
+        return self.connection.ops.quote_name(CHECKPOINT_TABLE)
+
+    def create(self) -> None:
+        self.delete()
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                """
+                CREATE TABLE {} (
+                    app_model_label varchar(255) NOT NULL,
+                    strategy varchar(255) NOT NULL,
+                    rows_imported integer NOT NULL,
+                    complete boolean NOT NULL,
+                    PRIMARY KEY (app_model_label, strategy)
+                )
+                """.format(
+                    self.table
+                ),
+            )
+
+        with self.lock:
+            self.progress = {}
+
+    def load(self) -> None:
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT app_model_label, strategy, rows_imported, complete "
+                "FROM {}".format(self.table),
+            )
+            rows = cursor.fetchall()
+
+        with self.lock:
+            self.progress = {(a, b): (c, bool(d)) for a, b, c, d in rows}
+
+    def delete(self) -> None:
+        if self.exists():
+            with self.connection.cursor() as cursor:
+                cursor.execute("DROP TABLE {}".format(self.table))
+
+    def get_progress(self, app_model_label: str, key: str) -> Tuple[int, bool]:
+        with self.lock:
+            return self.progress.get((app_model_label, key), (0, False))
+
+    def set_progress(
+        self,
+        app_model_label: str,
+        key: str,
+        rows: int,
+        complete: bool,
+    ) -> None:
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE {} SET rows_imported = %s, complete = %s "
+                "WHERE app_model_label = %s AND strategy = %s".format(
+                    self.table,
+                ),
+                [rows, complete, app_model_label, key],
+            )
+            if not cursor.rowcount:
+                cursor.execute(
+                    "INSERT INTO {} "
+                    "(app_model_label, strategy, rows_imported, complete) "
+                    "VALUES (%s, %s, %s, %s)".format(self.table),
+                    [app_model_label, key, rows, complete],
+                )
+
+        with self.lock:
+            self.progress[app_model_label, key] = (rows, complete)
+
+    def for_strategy(
+        self,
+        app_model_label: str,
+        key: str,
+    ) -> StrategyCheckpoint:
+        return StrategyCheckpoint(self, app_model_label, key)
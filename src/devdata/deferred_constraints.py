@@ -0,0 +1,210 @@
+"""
+Deferring the creation of secondary indexes and foreign key constraints until
+after an import, so that rows are loaded into tables without maintaining them
+and they're then built from the complete data.
+"""
+
+import re
+from typing import List, Optional
+
+from django.db import connections, transaction
+
+DEFERRED_TABLE = "devdata_deferred_constraints"
+
+INDEX = "index"
+FOREIGN_KEY = "foreign key"
+
+
+class DeferredConstraints:
+    """
+    The indexes and constraints dropped before an import, recorded in a table
+    in the database being imported to so that they're restored even if the
+    import is interrupted and resumed. Only Postgres is supported.
+    """
+
+    def __init__(self, django_dbname: str) -> None:
+        self.django_dbname = django_dbname
+
+    @property
+    def connection(self):
+        return connections[self.django_dbname]
+
+    @property
+    def table(self) -> str:
+        return self.connection.ops.quote_name(DEFERRED_TABLE)
+
+    def exists(self) -> bool:
+        return DEFERRED_TABLE in self.connection.introspection.table_names()
+
+    def delete(self) -> None:
+        if self.exists():
+            with self.connection.cursor() as cursor:
+                cursor.execute("DROP TABLE {}".format(self.table))
+
+    def defer(self, table_names: List[str]) -> None:
+        """
+        Drop the secondary indexes and foreign key constraints on the given
+        tables, recording their definitions. Primary keys and unique indexes
+        are kept as the import relies on them.
+        """
+        # Restore anything left deferred by an earlier import which was
+        # interrupted, rather than losing its record.
+        if self.exists():
+            self.restore()
+
+        with transaction.atomic(using=self.django_dbname):
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    """
+                    CREATE TABLE {} (
+                        name varchar(255) NOT NULL,
+                        table_name text NOT NULL,
+                        kind varchar(20) NOT NULL,
+                        definition text NOT NULL
+                    )
+                    """.format(
+                        self.table
+                    ),
+                )
+
+                cursor.execute(
+                    """
+                    SELECT c.conname, t.oid::regclass::text, %s,
+                        pg_get_constraintdef(c.oid)
+                    FROM pg_constraint c
+                    JOIN pg_class t ON t.oid = c.conrelid
+                    WHERE c.contype = 'f'
+                        AND t.relname = ANY(%s)
+                        AND pg_table_is_visible(t.oid)
+                    UNION ALL
+                    SELECT ic.relname, t.oid::regclass::text, %s,
+                        pg_get_indexdef(i.indexrelid)
+                    FROM pg_index i
+                    JOIN pg_class t ON t.oid = i.indrelid
+                    JOIN pg_class ic ON ic.oid = i.indexrelid
+                    WHERE NOT i.indisprimary
+                        AND NOT i.indisunique
+                        AND t.relname = ANY(%s)
+                        AND pg_table_is_visible(t.oid)
+                        AND NOT EXISTS (
+                            SELECT 1 FROM pg_constraint
+                            WHERE conindid = i.indexrelid
+                        )
+                    """,
+                    [FOREIGN_KEY, list(table_names), INDEX, list(table_names)],
+                )
+                deferred = cursor.fetchall()
+
+                cursor.executemany(
+                    "INSERT INTO {} (name, table_name, kind, definition) "
+                    "VALUES (%s, %s, %s, %s)".format(self.table),
+                    deferred,
+                )
+
+                quote_name = self.connection.ops.quote_name
+                for name, table_name, kind, _ in deferred:
+                    if kind == FOREIGN_KEY:
+                        cursor.execute(
+                            "ALTER TABLE {} DROP CONSTRAINT {}".format(
+                                table_name,
+                                quote_name(name),
+                            ),
+                        )
+                    else:
+                        cursor.execute(
+                            "DROP INDEX {}".format(quote_name(name)),
+                        )
+
+    def get_deferred(self, kind: str):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name, table_name, definition FROM {} "
+                "WHERE kind = %s ORDER BY table_name, name".format(self.table),
+                [kind],
+            )
+            return cursor.fetchall()
+
+    def is_index_valid(self, cursor, name: str) -> Optional[bool]:
+        """
+        Whether an index is valid, or None if it doesn't exist. A concurrent
+        index build which fails or is interrupted leaves an invalid index.
+        """
+        cursor.execute(
+            "SELECT i.indisvalid FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [name],
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def constraint_exists(self, cursor, table_name: str, name: str) -> bool:
+        cursor.execute(
+            "SELECT 1 FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND conname = %s",
+            [table_name, name],
+        )
+        return cursor.fetchone() is not None
+
+    def restore(self) -> None:
+        """
+        Recreate the deferred indexes, concurrently, and then the foreign key
+        constraints, which are added without checking the existing rows and
+        then validated. Each is forgotten once it's restored, so this can be
+        resumed if it fails part way through.
+        """
+        quote_name = self.connection.ops.quote_name
+
+        # Indexes can't be built concurrently within a transaction, so each is
+        # run in autocommit mode.
+        for name, table_name, definition in self.get_deferred(INDEX):
+            with self.connection.cursor() as cursor:
+                if self.is_index_valid(cursor, name) is False:
+                    cursor.execute(
+                        "DROP INDEX CONCURRENTLY {}".format(quote_name(name)),
+                    )
+                cursor.execute(
+                    re.sub(
+                        r"^CREATE INDEX ",
+                        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ",
+                        definition,
+                    ),
+                )
+                self.forget(cursor, name, table_name, INDEX)
+
+        foreign_keys = self.get_deferred(FOREIGN_KEY)
+
+        with transaction.atomic(using=self.django_dbname):
+            with self.connection.cursor() as cursor:
+                for name, table_name, definition in foreign_keys:
+                    if not self.constraint_exists(cursor, table_name, name):
+                        cursor.execute(
+                            "ALTER TABLE {} ADD CONSTRAINT {} {} "
+                            "NOT VALID".format(
+                                table_name,
+                                quote_name(name),
+                                definition,
+                            ),
+                        )
+
+        for name, table_name, _ in foreign_keys:
+            with transaction.atomic(using=self.django_dbname):
+                with self.connection.cursor() as cursor:
+                    cursor.execute(
+                        "ALTER TABLE {} VALIDATE CONSTRAINT {}".format(
+                            table_name,
+                            quote_name(name),
+                        ),
+                    )
+                    self.forget(cursor, name, table_name, FOREIGN_KEY)
+
+        self.delete()
+
+    def forget(self, cursor, name: str, table_name: str, kind: str) -> None:
+        cursor.execute(
+            "DELETE FROM {} "
+            "WHERE name = %s AND table_name = %s AND kind = %s".format(
+                self.table,
+            ),
+            [name, table_name, kind],
+        )
@@ -1,22 +1,38 @@
+import hashlib
 import json
+import os
+from pathlib import Path
 
+import django
+from django.apps import apps
 from django.core.management import call_command
 from django.core.management.color import no_style
+from django.core.management.sql import (
+    emit_post_migrate_signal,
+    emit_pre_migrate_signal,
+)
 from django.core.serializers.json import DjangoJSONEncoder
-from django.db import connections
+from django.db import connections, router, transaction
 from django.db.migrations.recorder import MigrationRecorder
 
+from .checkpoints import EXTRAS_LABEL
 from .extras import ExtraExport
+from .manifest import write_manifest
 from .settings import settings
 from .strategies import DeleteFirstQuerySetStrategy, Exportable
 from .utils import (
+    accepts_keyword,
     disable_migrations,
+    find_file,
     get_all_models,
     migrations_file_path,
+    open_file,
     progress,
-    sort_model_strategies,
+    remove_other_compressions,
+    run_in_dependency_order,
     to_app_model_label,
     to_model,
+    with_compression,
 )
 
 
@@ -50,10 +66,14 @@ def validate_strategies(only=None):
 
 
 def export_migration_state(django_dbname, dest):
-    file_path = migrations_file_path(dest)
+    file_path = with_compression(
+        migrations_file_path(dest),
+        settings.export_compression,
+    )
     file_path.parent.mkdir(parents=True, exist_ok=True)
+    remove_other_compressions(file_path)
 
-    with file_path.open("w") as f:
+    with open_file(file_path, "w") as f:
         with connections[django_dbname].cursor() as cursor:
             cursor.execute(
                 """
@@ -69,35 +89,113 @@ def export_migration_state(django_dbname, dest):
             json.dump(migration_state, f, indent=4, cls=DjangoJSONEncoder)
 
 
-def export_data(django_dbname, dest, only=None, no_update=False):
-    model_strategies = sort_model_strategies(settings.strategies)
+def run_model_strategies_concurrently(
+    django_dbname,
+    model_strategies,
+    func,
+    workers,
+    bar,
+):
+    """
+    Run `func(app_model_label, strategy)` for each of `model_strategies` on a
+    pool of `workers` threads, each with its own database connection.
+
+    The strategies for a model are run together, in order, and only once all
+    the models that model depends on have been completed.
+    """
+    strategies_by_model = {}
+    for app_model_label, strategy in model_strategies:
+        strategies_by_model.setdefault(app_model_label, []).append(strategy)
+
+    def run_model(app_model_label):
+        try:
+            for strategy in strategies_by_model[app_model_label]:
+                func(app_model_label, strategy)
+        finally:
+            # Django connections are per-thread, make sure that the pool's
+            # threads don't leave theirs open.
+            connections[django_dbname].close()
+
+    for app_model_label in run_in_dependency_order(
+        list(strategies_by_model),
+        settings.dependency_graph,
+        run_model,
+        workers,
+    ):
+        bar.update(len(strategies_by_model[app_model_label]))
+        bar.set_postfix({"model": app_model_label})
+
+
+def export_model_strategy(
+    django_dbname,
+    dest,
+    app_model_label,
+    strategy,
+    no_update=False,
+    log=lambda x: None,
+):
+    model = to_model(app_model_label)
+
+    if app_model_label in (
+        "contenttypes.ContentTypes",
+        "auth.Permissions",
+    ) and not isinstance(strategy, DeleteFirstQuerySetStrategy):
+        log(
+            "Warning! Django auto-creates entries in {} which means there "
+            "may be conflicts on import. It's recommended that strategies "
+            "for this table inherit from `DeleteFirstQuerySetStrategy` to "
+            "ensure the table is cleared out first. This should be safe to "
+            "do if imports are done on a fresh database as is "
+            "recommended.".format(app_model_label),
+        )
+
+    if isinstance(strategy, Exportable):
+        strategy.export_data(django_dbname, dest, model, no_update, log=log)
+
+
+def export_data(django_dbname, dest, only=None, no_update=False, workers=1):
+    model_strategies = settings.sorted_strategies
+
+    if workers > 1:
+        model_strategies = [
+            (app_model_label, strategy)
+            for app_model_label, strategy in model_strategies
+            if not only or app_model_label in only
+        ]
+        bar = progress(total=len(model_strategies))
+        with bar:
+            run_model_strategies_concurrently(
+                django_dbname,
+                model_strategies,
+                lambda app_model_label, strategy: export_model_strategy(
+                    django_dbname,
+                    dest,
+                    app_model_label,
+                    strategy,
+                    no_update,
+                    log=bar.write,
+                ),
+                workers,
+                bar,
+            )
+        return
+
     bar = progress(model_strategies)
     for app_model_label, strategy in bar:
         if only and app_model_label not in only:
             continue
 
-        model = to_model(app_model_label)
         bar.set_postfix(
             {"strategy": "{} ({})".format(app_model_label, strategy.name)}
         )
-
-        if app_model_label in (
-            "contenttypes.ContentTypes",
-            "auth.Permissions",
-        ) and not isinstance(strategy, DeleteFirstQuerySetStrategy):
-            bar.write(
-                "Warning! Django auto-creates entries in {} which means there "
-                "may be conflicts on import. It's recommended that strategies "
-                "for this table inherit from `DeleteFirstQuerySetStrategy` to "
-                "ensure the table is cleared out first. This should be safe to "
-                "do if imports are done on a fresh database as is "
-                "recommended.".format(app_model_label),
-            )
-
-        if isinstance(strategy, Exportable):
-            strategy.export_data(
-                django_dbname, dest, model, no_update, log=bar.write
-            )
+        export_model_strategy(
+            django_dbname,
+            dest,
+            app_model_label,
+            strategy,
+            no_update,
+            log=bar.write,
+        )
 
 
 def export_extras(django_dbname, dest, no_update=False):
@@ -114,24 +212,262 @@ def export_extras(django_dbname, dest, no_update=False):
             )
 
 
-def import_schema(src, django_dbname):
+def export_manifest(dest):
+    write_manifest(dest)
+
+
+# The number of schemas kept in the schema cache.
+SCHEMA_CACHE_SIZE = 20
+
+# The table recording the fingerprint of the schema imported into a database.
+SCHEMA_FINGERPRINT_TABLE = "devdata_schema_fingerprint"
+
+
+def get_schema_models(django_dbname, include_auto_created=False):
+    """
+    The models which `migrate --run-syncdb` would create tables for.
+    """
+    connection = connections[django_dbname]
+    return [
+        model
+        for app_config in apps.get_app_configs()
+        if app_config.models_module is not None
+        for model in router.get_migratable_models(
+            app_config,
+            django_dbname,
+            include_auto_created=include_auto_created,
+        )
+        if model._meta.can_migrate(connection)
+    ]
+
+
+def get_schema_fingerprint(django_dbname, migrations):
+    """
+    A hash identifying the schema the models define for the database, and the
+    exported migration state.
+    """
+    connection = connections[django_dbname]
+
+    def describe_field(field):
+        related_model = field.related_model
+        return [
+            field.column,
+            field.db_parameters(connection=connection),
+            field.null,
+            field.primary_key,
+            field.unique,
+            field.db_index,
+            field.db_tablespace,
+            related_model._meta.db_table if related_model else None,
+            getattr(field, "db_constraint", None),
+            # Added in Django 4.2 and 5.0 respectively.
+            getattr(field, "db_comment", None),
+            getattr(field, "db_default", None),
+        ]
+
+    def describe_model(model):
+        opts = model._meta
+        return [
+            to_app_model_label(model),
+            opts.db_table,
+            opts.db_tablespace,
+            getattr(opts, "db_table_comment", None),
+            [describe_field(x) for x in opts.local_fields],
+            sorted(opts.unique_together),
+            sorted(getattr(opts, "index_together", ())),
+            [index.deconstruct() for index in opts.indexes],
+            [constraint.deconstruct() for constraint in opts.constraints],
+        ]
+
+    content = json.dumps(
+        [
+            django.get_version(),
+            connection.vendor,
+            [
+                describe_model(x)
+                for x in get_schema_models(
+                    django_dbname,
+                    include_auto_created=True,
+                )
+            ],
+            migrations,
+        ],
+        default=repr,
+        sort_keys=True,
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def collect_schema_sql(django_dbname):
+    """
+    Collect the statements `migrate --run-syncdb` would run to create the
+    tables for the models, without running them.
+    """
+    connection = connections[django_dbname]
+    with connection.schema_editor(collect_sql=True, atomic=False) as editor:
+        for model in get_schema_models(django_dbname):
+            editor.create_model(model)
+    return editor.collected_sql
+
+
+def get_schema_sql(django_dbname, migrations):
+    """
+    Get the statements to create the tables for the models, from the schema
+    cache if they've been collected before. Returns None if the cache is
+    disabled or can't be written to.
+    """
+    cache_dir = settings.schema_cache_dir
+    if cache_dir is None:
+        return None
+
+    cache_dir = Path(cache_dir).expanduser()
+    cache_file = cache_dir / "{}.json".format(
+        get_schema_fingerprint(django_dbname, migrations),
+    )
+
+    try:
+        with cache_file.open() as f:
+            statements = json.load(f)
+        # Mark the schema as recently used, so that it's kept when pruning.
+        os.utime(cache_file)
+        return statements
+    except FileNotFoundError:
+        pass
+    except OSError:
+        return None
+
+    statements = collect_schema_sql(django_dbname)
+
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(".{}.tmp".format(os.getpid()))
+        with tmp_file.open("w") as f:
+            json.dump(statements, f)
+        tmp_file.replace(cache_file)
+        prune_schema_cache(cache_dir)
+    except OSError:
+        return None
+
+    return statements
+
+
+def prune_schema_cache(cache_dir):
+    """
+    Remove all but the most recently used schemas from the cache.
+    """
+    cache_files = sorted(
+        cache_dir.glob("*.json"),
+        key=lambda x: x.stat().st_mtime,
+        reverse=True,
+    )
+    for cache_file in cache_files[SCHEMA_CACHE_SIZE:]:
+        try:
+            cache_file.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def save_schema_fingerprint(django_dbname, fingerprint):
+    """
+    Record the fingerprint of the schema imported into a database, or clear it
+    with `None` when the schema wasn't created from the models alone.
+    """
     connection = connections[django_dbname]
+    table = connection.ops.quote_name(SCHEMA_FINGERPRINT_TABLE)
+
+    with transaction.atomic(using=django_dbname):
+        with connection.cursor() as cursor:
+            if (
+                SCHEMA_FINGERPRINT_TABLE
+                in connection.introspection.table_names(
+                    cursor,
+                )
+            ):
+                cursor.execute("DELETE FROM {}".format(table))
+            elif fingerprint is not None:
+                cursor.execute(
+                    "CREATE TABLE {} (fingerprint varchar(64) NOT NULL)".format(
+                        table,
+                    ),
+                )
+
+            if fingerprint is not None:
+                cursor.execute(
+                    "INSERT INTO {} (fingerprint) VALUES (%s)".format(table),
+                    [fingerprint],
+                )
+
+
+def get_saved_schema_fingerprint(django_dbname):
+    connection = connections[django_dbname]
+
+    with connection.cursor() as cursor:
+        if (
+            SCHEMA_FINGERPRINT_TABLE
+            not in connection.introspection.table_names(
+                cursor,
+            )
+        ):
+            return None
 
-    with disable_migrations():
-        call_command(
-            "migrate",
-            verbosity=0,
-            interactive=False,
-            database=django_dbname,
-            run_syncdb=True,
-            skip_checks=True,
+        cursor.execute(
+            "SELECT fingerprint FROM {}".format(
+                connection.ops.quote_name(SCHEMA_FINGERPRINT_TABLE),
+            ),
         )
+        row = cursor.fetchone()
 
-    call_command("createcachetable", database=django_dbname)
+    return row[0] if row else None
+
+
+def import_schema(src, django_dbname):
+    connection = connections[django_dbname]
 
-    with migrations_file_path(src).open() as f:
+    with open_file(find_file(migrations_file_path(src))) as f:
         migrations = json.load(f)
 
+    # Merging into existing tables needs `migrate` to work out which are
+    # missing, so the cached schema is only used for empty databases, and
+    # only then is the schema known to be that of the models.
+    is_empty = not (
+        set(connection.introspection.table_names()) - {SCHEMA_FINGERPRINT_TABLE}
+    )
+
+    statements = None
+    if is_empty:
+        statements = get_schema_sql(django_dbname, migrations)
+
+    if statements is None:
+        with disable_migrations():
+            call_command(
+                "migrate",
+                verbosity=0,
+                interactive=False,
+                database=django_dbname,
+                run_syncdb=True,
+                skip_checks=True,
+            )
+    else:
+        # Creating the tables from a cached script of the DDL that `migrate`
+        # would run is much faster than `migrate` itself.
+        with disable_migrations():
+            emit_pre_migrate_signal(
+                verbosity=0,
+                interactive=False,
+                db=django_dbname,
+            )
+            with transaction.atomic(using=django_dbname):
+                with connection.cursor() as cursor:
+                    for statement in statements:
+                        cursor.execute(statement)
+            emit_post_migrate_signal(
+                verbosity=0,
+                interactive=False,
+                db=django_dbname,
+            )
+
+    call_command("createcachetable", database=django_dbname)
+
     if migrations:
         # Django 4+ doesn't create `django_migrations` table when it detects
         # there aren't any migrations to run (including when using `run_syncdb`
@@ -148,23 +484,109 @@ def import_schema(src, django_dbname):
             [(x["app"], x["name"], x["applied"]) for x in migrations],
         )
 
+    save_schema_fingerprint(
+        django_dbname,
+        get_schema_fingerprint(django_dbname, migrations) if is_empty else None,
+    )
+
+
+def get_strategy_checkpoint_key(app_model_label, strategy):
+    index = settings.strategies[app_model_label].index(strategy)
+    return "{}:{}".format(
+        index,
+        getattr(strategy, "name", type(strategy).__name__),
+    )
+
+
+def import_model_strategy(
+    django_dbname,
+    src,
+    app_model_label,
+    strategy,
+    checkpoint=None,
+):
+    model = to_model(app_model_label)
+
+    if checkpoint is None:
+        strategy.import_data(django_dbname, src, model)
+        return
+
+    strategy_checkpoint = checkpoint.for_strategy(
+        app_model_label,
+        get_strategy_checkpoint_key(app_model_label, strategy),
+    )
+    if strategy_checkpoint.complete:
+        return
+
+    # Strategies which override `import_data` without taking a checkpoint are
+    # imported from the start if resumed.
+    if getattr(strategy, "supports_checkpoints", False) and accepts_keyword(
+        strategy.import_data,
+        "checkpoint",
+    ):
+        strategy.import_data(
+            django_dbname,
+            src,
+            model,
+            checkpoint=strategy_checkpoint,
+        )
+    else:
+        strategy.import_data(django_dbname, src, model)
+
+    strategy_checkpoint.mark_complete()
+
+
+def import_data(src, django_dbname, workers=1, checkpoint=None):
+    model_strategies = settings.sorted_strategies
+
+    if workers > 1:
+        bar = progress(total=len(model_strategies))
+        with bar:
+            run_model_strategies_concurrently(
+                django_dbname,
+                model_strategies,
+                lambda app_model_label, strategy: import_model_strategy(
+                    django_dbname,
+                    src,
+                    app_model_label,
+                    strategy,
+                    checkpoint,
+                ),
+                workers,
+                bar,
+            )
+        return
 
-def import_data(src, django_dbname):
-    model_strategies = sort_model_strategies(settings.strategies)
     bar = progress(model_strategies)
     for app_model_label, strategy in bar:
-        model = to_model(app_model_label)
         bar.set_postfix(
             {"strategy": "{} ({})".format(app_model_label, strategy.name)}
         )
-        strategy.import_data(django_dbname, src, model)
+        import_model_strategy(
+            django_dbname,
+            src,
+            app_model_label,
+            strategy,
+            checkpoint,
+        )
 
 
-def import_extras(src, django_dbname):
+def import_extras(src, django_dbname, checkpoint=None):
     bar = progress(settings.extra_strategies)
     for strategy in bar:
         bar.set_postfix({"extra": strategy.name})
-        strategy.import_data(django_dbname, src)
+
+        if checkpoint is None:
+            strategy.import_data(django_dbname, src)
+            continue
+
+        strategy_checkpoint = checkpoint.for_strategy(
+            EXTRAS_LABEL,
+            strategy.name,
+        )
+        if not strategy_checkpoint.complete:
+            strategy.import_data(django_dbname, src)
+            strategy_checkpoint.mark_complete()
 
 
 def import_cleanup(src, django_dbname):
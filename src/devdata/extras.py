@@ -5,6 +5,14 @@ from typing import Callable, Dict, Set, Tuple
 
 from django.db import connections
 
+from .settings import settings
+from .utils import (
+    find_file,
+    open_file,
+    remove_other_compressions,
+    with_compression,
+)
+
 Logger = Callable[[object], None]
 
 
@@ -49,7 +57,10 @@ class ExtraExport:
         pass
 
     def data_file(self, dest: Path) -> Path:
-        return dest / f"{self.name}.json"
+        return with_compression(
+            dest / f"{self.name}.json",
+            settings.export_compression,
+        )
 
     def ensure_dir_exists(self, dest: Path) -> None:
         unique_key = self.name
@@ -88,7 +99,7 @@ class PostgresSequences(ExtraExport, ExtraImport):
     ) -> None:
         data_file = self.data_file(dest)
 
-        if no_update and data_file.exists():
+        if no_update and find_file(data_file).exists():
             return
 
         columns = (
@@ -147,11 +158,12 @@ class PostgresSequences(ExtraExport, ExtraImport):
                     cursor.execute(f"SELECT last_value FROM {name}")
                     (sequence_state["last_value"],) = cursor.fetchone()
 
-        with data_file.open("w") as f:
+        remove_other_compressions(data_file)
+        with open_file(data_file, "w") as f:
             json.dump(sequences_state, f, indent=4)
 
     def import_data(self, django_dbname: str, src: Path) -> None:
-        with self.data_file(src).open() as f:
+        with open_file(find_file(self.data_file(src))) as f:
             sequences = json.load(f)
 
         def check_simple_value(mapping: Dict[str, str], *, key: str) -> str:
@@ -8,6 +8,7 @@ from django.db.utils import DEFAULT_DB_ALIAS
 from ...engine import (
     export_data,
     export_extras,
+    export_manifest,
     export_migration_state,
     validate_strategies,
 )
@@ -39,8 +40,29 @@ class Command(BaseCommand):
             help="Skip updates that already exist and are non-empty.",
             action="store_true",
         )
+        parser.add_argument(
+            "--workers",
+            help=(
+                "Number of models to export concurrently, each using its own "
+                "database connection (default: %(default)s)."
+            ),
+            type=int,
+            default=1,
+        )
+
+    def handle(
+        self,
+        *,
+        dest,
+        only=None,
+        database,
+        no_update,
+        workers=1,
+        **options,
+    ):
+        if workers < 1:
+            raise CommandError("--workers must be at least 1.")
 
-    def handle(self, *, dest, only=None, database, no_update, **options):
         try:
             for app_model_label in only:
                 apps.get_model(app_model_label, require_ready=False)
@@ -55,5 +77,6 @@ class Command(BaseCommand):
         dest_dir = (Path.cwd() / dest).absolute()
 
         export_migration_state(database, dest_dir)
-        export_data(database, dest_dir, only, no_update)
+        export_data(database, dest_dir, only, no_update, workers)
         export_extras(database, dest_dir)
+        export_manifest(dest_dir)
@@ -3,16 +3,21 @@ import socket
 from pathlib import Path
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 from django.db.utils import DEFAULT_DB_ALIAS
 
+from ...checkpoints import ImportCheckpoint
+from ...deferred_constraints import DeferredConstraints
 from ...engine import (
+    get_schema_models,
     import_cleanup,
     import_data,
     import_extras,
     import_schema,
     validate_strategies,
 )
-from ...reset_modes import MODES, DropDatabaseReset
+from ...manifest import manifest_file_path, verify_export
+from ...reset_modes import MODES, DropDatabaseReset, TemplateDatabaseReset
 from ...settings import settings
 
 
@@ -38,37 +43,153 @@ class Command(BaseCommand):
             help="How to ensure the database is empty before importing the new schema (default: %(default)s).",
             default=DropDatabaseReset.slug,
         )
+        parser.add_argument(
+            "--defer-indexes",
+            help=(
+                "Drop secondary indexes and foreign key constraints before "
+                "importing and recreate them afterwards (Postgres only)."
+            ),
+            action="store_true",
+        )
         parser.add_argument(
             "--no-input",
             help="Disable confirmations before danger actions.",
             action="store_true",
         )
+        parser.add_argument(
+            "--resume",
+            help=(
+                "Continue an import which failed part way through, without "
+                "resetting the database."
+            ),
+            action="store_true",
+        )
+        parser.add_argument(
+            "--snapshot",
+            help=(
+                "Save a snapshot of the database after importing, which later "
+                "imports of the same export restore instead of importing "
+                "again. Requires the template-database reset mode."
+            ),
+            action="store_true",
+        )
+        parser.add_argument(
+            "--verify",
+            help=(
+                "Check the files to import against the manifest written by "
+                "the export before changing the database."
+            ),
+            action="store_true",
+        )
+        parser.add_argument(
+            "--workers",
+            help=(
+                "Number of models to import concurrently, each using its own "
+                "database connection (default: %(default)s)."
+            ),
+            type=int,
+            default=1,
+        )
+
+    def handle(
+        self,
+        src,
+        database,
+        reset_mode,
+        no_input=False,
+        workers=1,
+        verify=False,
+        resume=False,
+        snapshot=False,
+        defer_indexes=False,
+        **options,
+    ):
+        if workers < 1:
+            raise CommandError("--workers must be at least 1.")
+
+        if snapshot and not isinstance(reset_mode, TemplateDatabaseReset):
+            raise CommandError(
+                "--snapshot requires --reset-mode={}.".format(
+                    TemplateDatabaseReset.slug,
+                ),
+            )
+
+        src = (Path.cwd() / src).absolute()
+
+        if verify:
+            if not manifest_file_path(src).exists():
+                raise CommandError("No manifest found in {}".format(src))
+
+            problems = verify_export(src)
+            if problems:
+                raise CommandError(
+                    "Import source doesn't match its manifest:\n{}".format(
+                        "\n".join("  * {}".format(x) for x in problems),
+                    ),
+                )
+
+        if defer_indexes and connections[database].vendor != "postgresql":
+            raise CommandError("--defer-indexes is only supported on Postgres.")
 
-    def handle(self, src, database, reset_mode, no_input=False, **options):
         try:
             validate_strategies()
         except AssertionError as e:
             raise CommandError(e)
 
-        if not no_input and (
-            input(
-                "You're about to {} {} ({}) from the host {}. "
-                "Are you sure you want to continue? [y/N]: ".format(
-                    reset_mode.description_for_confirmation,
-                    self.style.WARNING(database),
-                    self.style.WARNING(settings.DATABASES[database]["NAME"]),
-                    self.style.WARNING(socket.gethostname()),
-                ),
-            ).lower()
-            != "y"
-        ):
-            raise CommandError("Aborted")
+        checkpoint = ImportCheckpoint(database)
+        deferred_constraints = DeferredConstraints(database)
 
-        reset_mode.reset_database(database)
+        if resume:
+            if not checkpoint.exists():
+                raise CommandError("There's no interrupted import to resume.")
+            checkpoint.load()
+        else:
+            if not no_input and (
+                input(
+                    "You're about to {} {} ({}) from the host {}. "
+                    "Are you sure you want to continue? [y/N]: ".format(
+                        reset_mode.description_for_confirmation,
+                        self.style.WARNING(database),
+                        self.style.WARNING(
+                            settings.DATABASES[database]["NAME"],
+                        ),
+                        self.style.WARNING(socket.gethostname()),
+                    ),
+                ).lower()
+                != "y"
+            ):
+                raise CommandError("Aborted")
 
-        src = (Path.cwd() / src).absolute()
+            if reset_mode.restore_snapshot(database, src):
+                self.stdout.write("Restored database from snapshot.")
+                return
+
+            if not reset_mode.reset_data(database, src):
+                reset_mode.reset_database(database)
+                import_schema(src, database)
+            checkpoint.create()
+
+            if defer_indexes:
+                deferred_constraints.defer(
+                    [
+                        x._meta.db_table
+                        for x in get_schema_models(
+                            database,
+                            include_auto_created=True,
+                        )
+                    ],
+                )
+
+        import_data(src, database, workers, checkpoint)
+        import_extras(src, database, checkpoint)
+
+        # When resuming, indexes deferred by the interrupted import are
+        # restored even if `--defer-indexes` isn't passed again.
+        if deferred_constraints.exists():
+            deferred_constraints.restore()
 
-        import_schema(src, database)
-        import_data(src, database)
-        import_extras(src, database)
         import_cleanup(src, database)
+        checkpoint.delete()
+
+        if snapshot:
+            reset_mode.save_snapshot(database, src)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...settings import settings
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the order in which models are exported and imported, as levels "
+        "which depend only on earlier levels."
+    )
+
+    def handle(self, **options):
+        try:
+            levels = settings.dependency_levels
+        except RuntimeError as e:
+            raise CommandError(e)
+
+        dependency_graph = settings.dependency_graph
+
+        for index, level in enumerate(levels):
+            self.stdout.write("Level {}:".format(index))
+
+            for app_model_label in level:
+                strategies = settings.strategies[app_model_label]
+                self.stdout.write(
+                    "  {} [{}]".format(
+                        app_model_label,
+                        ", ".join(
+                            getattr(x, "name", type(x).__name__)
+                            for x in strategies
+                        )
+                        or "no strategies",
+                    )
+                )
+
+                dependencies = sorted(dependency_graph[app_model_label])
+                if dependencies:
+                    self.stdout.write(
+                        "    depends on: {}".format(", ".join(dependencies))
+                    )
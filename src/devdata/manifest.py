@@ -0,0 +1,302 @@
+"""
+Manifests describing the files in an export directory, so that exports can be
+verified and synchronised without comparing or transferring whole files.
+"""
+
+import hashlib
+import json
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+from .utils import get_export_format, iter_exported_objects, read_pk_index
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 2
+
+# Files are hashed in chunks of about this size on average, so that a change to
+# part of a large file only invalidates the chunks it touches.
+CHUNK_SIZE = 8 * 1024 * 1024
+
+Manifest = Dict[str, Any]
+
+
+def manifest_file_path(dest: Path) -> Path:
+    return dest / MANIFEST_FILE
+
+
+def get_manifest_files(dest: Path) -> List[Path]:
+    files = []
+    for path in dest.rglob("*"):
+        relative_path = path.relative_to(dest)
+        if (
+            path.is_file()
+            and relative_path.as_posix() != MANIFEST_FILE
+            # Skip temporary files written during an export.
+            and ".tmp" not in relative_path.parts
+        ):
+            files.append(path)
+    return sorted(files)
+
+
+def count_rows(dest: Path, path: Path) -> Optional[int]:
+    """
+    Count the rows in a data file, from its primary key index where possible.
+    Returns None for files which aren't data files.
+    """
+    # Data files are stored in a directory for each model.
+    if path.parent == dest:
+        return None
+
+    try:
+        get_export_format(path)
+    except ValueError:
+        return None
+
+    pks = read_pk_index(path)
+    if pks is not None:
+        return len(pks)
+
+    return sum(1 for _ in iter_exported_objects(path))
+
+
+def iter_chunks(f: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+    """
+    Split a file into chunks with boundaries defined by its content rather
+    than by offsets, so that inserting or removing rows only changes the
+    chunks around them rather than every chunk after them.
+
+    A chunk ends after a line whose CRC-32 falls below a threshold proportional
+    to the line's length, so that chunks are `chunk_size` bytes on average.
+    Chunks are at least a quarter and at most four times that size, with lines
+    longer than that split at the maximum size.
+    """
+    min_size = chunk_size // 4
+    max_size = chunk_size * 4
+    # The probability of a chunk ending after a line, per byte of the line.
+    threshold_per_byte = 2**32 / max(chunk_size - min_size, 1)
+
+    chunk = bytearray()
+    # Lines are read at most `max_size` bytes at a time, so that files without
+    # newlines, e.g. JSON exports without indentation, aren't read whole.
+    for line in iter(lambda: f.readline(max_size), b""):
+        ends_chunk = zlib.crc32(line) < len(line) * threshold_per_byte
+
+        while len(chunk) + len(line) >= max_size:
+            split_at = max_size - len(chunk)
+            chunk += line[:split_at]
+            line = line[split_at:]
+            yield bytes(chunk)
+            chunk = bytearray()
+
+        chunk += line
+        if ends_chunk and len(chunk) >= min_size:
+            yield bytes(chunk)
+            chunk = bytearray()
+
+    if chunk:
+        yield bytes(chunk)
+
+
+def describe_file(
+    dest: Path,
+    path: Path,
+    chunk_size: int = CHUNK_SIZE,
+) -> Dict[str, Any]:
+    file_hash = hashlib.sha256()
+    chunks = []
+
+    with path.open("rb") as f:
+        for chunk in iter_chunks(f, chunk_size):
+            file_hash.update(chunk)
+            chunks.append([len(chunk), hashlib.sha256(chunk).hexdigest()])
+
+    return {
+        "size": path.stat().st_size,
+        "sha256": file_hash.hexdigest(),
+        "rows": count_rows(dest, path),
+        "chunks": chunks,
+    }
+
+
+def build_manifest(dest: Path, chunk_size: int = CHUNK_SIZE) -> Manifest:
+    """
+    Describe each file in an export directory: its size, the number of rows
+    for data files, and the SHA-256 hash of its content and the size and hash
+    of each of its chunks, which are `chunk_size` bytes on average.
+    """
+    return {
+        "version": MANIFEST_VERSION,
+        "chunk_size": chunk_size,
+        "files": {
+            path.relative_to(dest).as_posix(): describe_file(
+                dest, path, chunk_size
+            )
+            for path in get_manifest_files(dest)
+        },
+    }
+
+
+def write_manifest(dest: Path) -> Manifest:
+    manifest = build_manifest(dest)
+    with manifest_file_path(dest).open("w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+    return manifest
+
+
+def read_manifest(src: Path) -> Manifest:
+    with manifest_file_path(src).open() as f:
+        manifest = json.load(f)
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(
+            "Unsupported manifest version {!r} in {}".format(
+                manifest.get("version"),
+                manifest_file_path(src),
+            ),
+        )
+
+    return manifest
+
+
+def get_changed_chunks(
+    previous: Manifest,
+    current: Manifest,
+) -> Dict[str, List[int]]:
+    """
+    Map each file in the current manifest which differs from the previous one
+    to the indexes of its chunks whose content isn't in the previous version
+    of the file, e.g. to fetch only those.
+    """
+    if previous["chunk_size"] != current["chunk_size"]:
+        previous = {"files": {}}
+
+    changed = {}
+    for path, description in current["files"].items():
+        previous_description = previous["files"].get(path)
+        if previous_description == description:
+            continue
+
+        previous_chunks = {
+            sha256
+            for _, sha256 in (previous_description or {}).get("chunks", [])
+        }
+        changed[path] = [
+            index
+            for index, (_, sha256) in enumerate(description["chunks"])
+            if sha256 not in previous_chunks
+        ]
+
+    return changed
+
+
+def verify_export(src: Path) -> List[str]:
+    """
+    Check an export directory against its manifest, returning a description
+    of each difference.
+    """
+    expected = read_manifest(src)
+    actual = build_manifest(src, expected["chunk_size"])
+
+    problems = []
+    for path in sorted(expected["files"].keys() - actual["files"].keys()):
+        problems.append("{}: missing".format(path))
+
+    for path in sorted(actual["files"].keys() - expected["files"].keys()):
+        problems.append("{}: not in manifest".format(path))
+
+    for path, chunks in sorted(get_changed_chunks(expected, actual).items()):
+        if path not in expected["files"]:
+            continue
+
+        expected_size = expected["files"][path]["size"]
+        actual_size = actual["files"][path]["size"]
+        if expected_size != actual_size:
+            problems.append(
+                "{}: expected {} bytes, found {}".format(
+                    path,
+                    expected_size,
+                    actual_size,
+                ),
+            )
+        elif chunks:
+            problems.append(
+                "{}: content differs in chunks {}".format(
+                    path,
+                    ", ".join(str(x) for x in chunks),
+                ),
+            )
+        elif expected["files"][path]["rows"] != actual["files"][path]["rows"]:
+            problems.append(
+                "{}: expected {} rows, found {}".format(
+                    path,
+                    expected["files"][path]["rows"],
+                    actual["files"][path]["rows"],
+                ),
+            )
+        else:
+            # The same chunks, in a different order.
+            problems.append("{}: content differs".format(path))
+
+    return problems
+
+
+def get_export_fingerprint(manifest: Manifest) -> str:
+    """
+    A hash identifying the content of an export as described by its manifest.
+    """
+    content = json.dumps(
+        sorted(
+            (path, description["sha256"])
+            for path, description in manifest["files"].items()
+        ),
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    file_hash = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def get_content_fingerprint(src: Path) -> str:
+    """
+    A hash identifying the content of an export as it is on disk, matching
+    `get_export_fingerprint` for its manifest when that's up to date.
+
+    Files with the size recorded in the manifest which haven't been modified
+    since it was written aren't read, their recorded hash is used instead, so
+    that only files changed since the manifest was written are hashed.
+    """
+    try:
+        manifest = read_manifest(src)
+        manifest_mtime_ns = manifest_file_path(src).stat().st_mtime_ns
+    except (OSError, ValueError):
+        manifest = {"files": {}}
+        manifest_mtime_ns = 0
+
+    def get_hash(path: Path) -> str:
+        description = manifest["files"].get(path.relative_to(src).as_posix())
+        stat = path.stat()
+        if (
+            description is not None
+            and description["size"] == stat.st_size
+            # Files modified at the same time as the manifest was written may
+            # have changed after they were hashed.
+            and stat.st_mtime_ns < manifest_mtime_ns
+        ):
+            return description["sha256"]
+        return hash_file(path)
+
+    return get_export_fingerprint(
+        {
+            "files": {
+                path.relative_to(src).as_posix(): {"sha256": get_hash(path)}
+                for path in get_manifest_files(src)
+            },
+        },
+    )
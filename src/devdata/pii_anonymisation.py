@@ -1,42 +1,243 @@
+import hashlib
+import hmac
+import itertools
+import json
+import sqlite3
+from typing import Any, Dict, Iterable, Mapping
+
 import faker
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.serializers.json import Serializer as JSONSerializer
+from django.core.serializers.jsonl import Serializer as JSONLSerializer
 
+from .anonymisers import anonymise_many, prepare_anonymiser
 from .settings import settings
-from .utils import to_app_model_label
+from .utils import batched, to_app_model_label
+
+
+class AnonymisationStore:
+    """
+    Replacements for anonymised values, keyed by a keyed hash of the original
+    value. Stored in memory, or in a SQLite database to be reused between
+    exports. The original values themselves are never stored.
+    """
+
+    def __init__(self, key: bytes, path=None):
+        self.key = key
+        self.connection = sqlite3.connect(
+            ":memory:" if path is None else str(path),
+            timeout=30,
+            check_same_thread=False,
+        )
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS replacements "
+                "(digest TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+
+    def get_digest(self, cache_key: str, value: Any) -> str:
+        message = "{}\0{}".format(
+            cache_key,
+            json.dumps(value, cls=DjangoJSONEncoder, sort_keys=True),
+        )
+        return hmac.new(self.key, message.encode(), hashlib.sha256).hexdigest()
+
+    def get_many(self, digests: Iterable[str]) -> Dict[str, Any]:
+        replacements = {}
+        for chunk in batched(digests, 500):
+            rows = self.connection.execute(
+                "SELECT digest, value FROM replacements "
+                "WHERE digest IN ({})".format(", ".join("?" * len(chunk))),
+                chunk,
+            )
+            replacements.update((x, json.loads(y)) for x, y in rows)
+        return replacements
+
+    def set_many(self, replacements: Mapping[str, Any]) -> None:
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO replacements (digest, value) "
+                "VALUES (?, ?)",
+                [
+                    (digest, json.dumps(value, cls=DjangoJSONEncoder))
+                    for digest, value in replacements.items()
+                ],
+            )
+
+    def close(self) -> None:
+        self.connection.close()
 
 
-class PiiAnonymisingSerializer(JSONSerializer):
+class PiiAnonymisingMixin:
+    # The number of rows to buffer, per call to each anonymiser's `batch`.
+    anonymisation_batch_size = 1000
+
     def __init__(self, *args, dest, **kwargs):
         super().__init__(*args, **kwargs)
         self.fake = faker.Faker(locale=settings.faker_locales)
         self.dest = dest
 
-    def get_dump_object(self, obj):
-        data = super().get_dump_object(obj)
+        self.field_anonymisers = settings.field_anonymisers
+        self.model_anonymisers = settings.model_anonymisers
+        self.anonymisation_plans = {}
 
-        for field, value in data["fields"].items():
-            if field in settings.field_anonymisers:
-                data["fields"][field] = settings.field_anonymisers[field](
-                    obj=obj,
-                    field=field,
-                    pii_value=value,
-                    fake=self.fake,
+        self.anonymisation_key = settings.anonymisation_key
+        self.anonymisation_store_path = settings.anonymisation_store
+        self.anonymisation_store = None
+
+    def get_anonymisation_plan(self, model):
+        """
+        The (field name, anonymiser) pairs to apply to serialized instances of
+        the given model. Model specific anonymisers take precedence over those
+        configured for all fields of a given name. Plans are kept until the end
+        of the serialization, along with anything the anonymisers prepared.
+        """
+        try:
+            return self.anonymisation_plans[model]
+        except KeyError:
+            pass
+
+        anonymisers = {
+            **self.field_anonymisers,
+            **self.model_anonymisers.get(to_app_model_label(model), {}),
+        }
+
+        opts = model._meta.concrete_model._meta
+        plan = [
+            (
+                field.name,
+                prepare_anonymiser(
+                    anonymisers[field.name],
+                    model=model,
+                    field=field.name,
                     dest=self.dest,
-                )
+                ),
+            )
+            for field in [*opts.local_fields, *opts.local_many_to_many]
+            if field.serialize and field.name in anonymisers
+        ]
+
+        self.anonymisation_plans[model] = plan
+        return plan
 
-            app_model_label = to_app_model_label(obj.__class__)
-            model_anonymisers = settings.model_anonymisers.get(
-                app_model_label,
-                {},
+    def start_serialization(self):
+        super().start_serialization()
+        self.pending_objects = []
+        self.objects_written = 0
+
+        if self.anonymisation_key is not None:
+            self.anonymisation_store = AnonymisationStore(
+                self.anonymisation_key,
+                self.anonymisation_store_path,
             )
 
-            if field in model_anonymisers:
-                data["fields"][field] = model_anonymisers[field](
-                    obj=obj,
+    def end_serialization(self):
+        self.flush_objects()
+        super().end_serialization()
+
+        self.anonymisation_plans = {}
+
+        if self.anonymisation_store is not None:
+            self.anonymisation_store.close()
+            self.anonymisation_store = None
+
+    def end_object(self, obj):
+        fields = self.pop_object_fields()
+
+        if self.get_anonymisation_plan(obj.__class__) or self.pending_objects:
+            # Buffer rows so that anonymisers are called for a column of
+            # values at a time.
+            self.pending_objects.append((obj, fields))
+            if len(self.pending_objects) >= self.anonymisation_batch_size:
+                self.flush_objects()
+        else:
+            self.write_object(obj, fields)
+
+    def flush_objects(self):
+        pending, self.pending_objects = self.pending_objects, []
+
+        for model, rows in itertools.groupby(pending, lambda x: x[0].__class__):
+            rows = list(rows)
+            for field, anonymiser in self.get_anonymisation_plan(model):
+                rows_with_field = [x for x in rows if field in x[1]]
+                replacements = self.anonymise_column(
+                    anonymiser,
+                    objs=[obj for obj, _ in rows_with_field],
                     field=field,
-                    pii_value=value,
-                    fake=self.fake,
-                    dest=self.dest,
+                    pii_values=[fields[field] for _, fields in rows_with_field],
                 )
+                for (_, fields), replacement in zip(
+                    rows_with_field,
+                    replacements,
+                ):
+                    fields[field] = replacement
+
+            for obj, fields in rows:
+                self.write_object(obj, fields)
+
+    def anonymise_column(self, anonymiser, *, objs, field, pii_values):
+        store = self.anonymisation_store
+        cache_key = getattr(anonymiser, "cache_key", None)
+        if store is None or cache_key is None:
+            return anonymise_many(
+                anonymiser,
+                objs=objs,
+                field=field,
+                pii_values=pii_values,
+                fake=self.fake,
+                dest=self.dest,
+            )
+
+        # Deterministic anonymisation: reuse stored replacements, otherwise
+        # generate each replacement with Faker seeded from the value's hash.
+        # With several locales Faker picks one using the global random state,
+        # so the locale is also picked from the hash and its generator used
+        # directly.
+        digests = [store.get_digest(cache_key, x) for x in pii_values]
+        replacements = store.get_many(set(digests))
+        locales = self.fake.locales
+
+        new_replacements = {}
+        for obj, pii_value, digest in zip(objs, pii_values, digests):
+            if digest in replacements:
+                continue
+            fake = self.fake[locales[int(digest[16:24], 16) % len(locales)]]
+            fake.seed_instance(int(digest[:16], 16))
+            replacements[digest] = new_replacements[digest] = anonymiser(
+                obj=obj,
+                field=field,
+                pii_value=pii_value,
+                fake=fake,
+                dest=self.dest,
+            )
+
+        if new_replacements:
+            self.fake.seed_instance()
+            store.set_many(new_replacements)
+
+        return [replacements[x] for x in digests]
+
+    # Buffering objects relies on two internals of Django's JSON serializers,
+    # which are only accessed here: the fields of the object being serialized
+    # are accumulated in `_current`, and `first` records whether any object has
+    # been written yet (for separators). Checked against Django 3.2 to 5.0.
+
+    def pop_object_fields(self):
+        fields, self._current = self._current, None
+        return fields
+
+    def write_object(self, obj, fields):
+        self._current = fields
+        # Objects may be written after `serialize` has moved past them, so
+        # track whether the output is still empty here.
+        self.first = self.objects_written == 0
+        super().end_object(obj)
+        self.objects_written += 1
+
+
+class PiiAnonymisingSerializer(PiiAnonymisingMixin, JSONSerializer):
+    pass
+
 
-        return data
+class PiiAnonymisingJSONLSerializer(PiiAnonymisingMixin, JSONLSerializer):
+    pass
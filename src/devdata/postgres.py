@@ -0,0 +1,240 @@
+"""
+Fast paths for moving data in and out of Postgres databases.
+"""
+
+import codecs
+import datetime
+import io
+import json
+from typing import Iterable, List
+
+from django.db.models import Model
+
+from .utils import batched
+
+# Field types whose prepared database values have a known text representation
+# in Postgres' COPY format. Models with other fields use the generic paths.
+COPY_FIELD_TYPES = {
+    "AutoField",
+    "BigAutoField",
+    "BigIntegerField",
+    "BinaryField",
+    "BooleanField",
+    "CharField",
+    "DateField",
+    "DateTimeField",
+    "DecimalField",
+    "DurationField",
+    "FileField",
+    "FilePathField",
+    "FloatField",
+    "ForeignKey",
+    "GenericIPAddressField",
+    "IPAddressField",
+    "IntegerField",
+    "JSONField",
+    "NullBooleanField",
+    "OneToOneField",
+    "PositiveBigIntegerField",
+    "PositiveIntegerField",
+    "PositiveSmallIntegerField",
+    "SlugField",
+    "SmallAutoField",
+    "SmallIntegerField",
+    "TextField",
+    "TimeField",
+    "UUIDField",
+}
+
+COPY_ESCAPES = str.maketrans(
+    {
+        "\\": "\\\\",
+        "\t": "\\t",
+        "\n": "\\n",
+        "\r": "\\r",
+    }
+)
+
+
+def is_postgres(connection) -> bool:
+    return connection.vendor == "postgresql"
+
+
+def get_copy_fields(model: Model):
+    return [
+        field
+        for field in model._meta.concrete_fields
+        if not getattr(field, "generated", False)
+    ]
+
+
+def supports_copy(connection, model: Model) -> bool:
+    """
+    Whether rows for the given model can be loaded with `copy_objects`.
+    """
+    if not is_postgres(connection) or model._meta.parents:
+        return False
+
+    return all(
+        field.get_internal_type() in COPY_FIELD_TYPES
+        for field in get_copy_fields(model)
+    )
+
+
+def to_copy_text(value) -> str:
+    if value is None:
+        return "\\N"
+
+    if isinstance(value, bool):
+        text = "t" if value else "f"
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        text = "\\x" + bytes(value).hex()
+    elif isinstance(value, datetime.timedelta):
+        text = "{} days {} seconds {} microseconds".format(
+            value.days,
+            value.seconds,
+            value.microseconds,
+        )
+    elif isinstance(value, (datetime.date, datetime.time)):
+        text = value.isoformat()
+    else:
+        text = str(value)
+
+    return text.translate(COPY_ESCAPES)
+
+
+def get_copy_value(field, obj):
+    # Match the values which `bulk_create` would insert for the object.
+    value = field.pre_save(obj, add=True)
+
+    if field.get_internal_type() == "JSONField":
+        if value is None:
+            return None
+        return json.dumps(value, cls=field.encoder)
+
+    # Use the Python-level preparation only, the database level adaptation
+    # may wrap values in driver specific types which have no text form.
+    return field.get_prep_value(value)
+
+
+def copy_objects(connection, model: Model, objects: Iterable[Model]) -> None:
+    """
+    Insert model instances into the model's table using `COPY ... FROM STDIN`.
+    """
+    fields = get_copy_fields(model)
+    quote_name = connection.ops.quote_name
+
+    lines: List[str] = []
+    for obj in objects:
+        values = [get_copy_value(field, obj) for field in fields]
+        lines.append("\t".join(to_copy_text(x) for x in values) + "\n")
+
+    if not lines:
+        return
+
+    sql = "COPY {} ({}) FROM STDIN".format(
+        quote_name(model._meta.db_table),
+        ", ".join(quote_name(field.column) for field in fields),
+    )
+
+    with connection.cursor() as cursor:
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, "copy_expert"):
+            # psycopg2
+            raw_cursor.copy_expert(sql, io.StringIO("".join(lines)))
+        else:
+            # psycopg 3
+            with raw_cursor.copy(sql) as copy:
+                for line in lines:
+                    copy.write(line)
+
+
+def supports_copy_export(connection, model: Model) -> bool:
+    """
+    Whether rows for the given model can be exported with `copy_to_jsonl`.
+    """
+    return is_postgres(connection) and all(
+        field.get_internal_type() in COPY_FIELD_TYPES
+        for field in model._meta.concrete_fields
+    )
+
+
+def get_json_value_sql(field, column: str) -> str:
+    # Match the representation used by Django's serializers where the default
+    # conversion to JSON differs.
+    internal_type = field.get_internal_type()
+    if internal_type == "DecimalField":
+        return "{}::text".format(column)
+    if internal_type == "BinaryField":
+        return "translate(encode({}, 'base64'), E'\\n', '')".format(column)
+    return column
+
+
+def get_json_export_sql(queryset):
+    """
+    Build SQL which selects each row of the queryset as a JSON object in the
+    structure used by Django's serializers, for use with `COPY ... TO`.
+    """
+    model = queryset.model
+    pk = model._meta.pk
+    fields = [
+        x for x in model._meta.concrete_model._meta.local_fields if x.serialize
+    ]
+
+    inner_sql, params = queryset.values_list(
+        pk.attname, *[x.attname for x in fields]
+    ).query.sql_with_params()
+    columns = ["c{}".format(index) for index in range(len(fields) + 1)]
+
+    # `json_build_object` is limited to 100 arguments, so wide models are
+    # built from several (jsonb) objects.
+    pairs = [
+        "'{}', {}".format(field.name, get_json_value_sql(field, "t." + column))
+        for field, column in zip(fields, columns[1:])
+    ]
+    if len(pairs) <= 50:
+        fields_sql = "json_build_object({})".format(", ".join(pairs))
+    else:
+        fields_sql = " || ".join(
+            "jsonb_build_object({})".format(", ".join(chunk))
+            for chunk in batched(pairs, 50)
+        )
+
+    sql = """
+        SELECT json_build_object('model', %s, 'pk', t.c0, 'fields', {fields})
+        FROM ({inner}) AS t({columns})
+    """.format(
+        fields=fields_sql,
+        inner=inner_sql,
+        columns=", ".join(columns),
+    )
+
+    return sql, (model._meta.label_lower, *params)
+
+
+def copy_to_jsonl(connection, queryset, output) -> int:
+    """
+    Write the rows of a queryset to a text stream as JSON Lines, serialized by
+    Postgres using `COPY ... TO STDOUT`. Returns the number of rows written.
+    """
+    query_sql, params = get_json_export_sql(queryset)
+
+    # CSV with quote and delimiter characters which never appear unescaped in
+    # JSON output, so that each JSON object is written as is, one per line.
+    sql = "COPY ({}) TO STDOUT WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')"
+
+    with connection.cursor() as cursor:
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, "copy_expert"):
+            # psycopg2
+            query_sql = raw_cursor.mogrify(query_sql, params).decode()
+            raw_cursor.copy_expert(sql.format(query_sql), output)
+        else:
+            # psycopg 3
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            with raw_cursor.copy(sql.format(query_sql), params) as copy:
+                for data in copy:
+                    output.write(decoder.decode(bytes(data)))
+            output.write(decoder.decode(b"", final=True))
+
+        return raw_cursor.rowcount
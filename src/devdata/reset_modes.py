@@ -3,12 +3,31 @@ Alternative implementations for ensuring a clean database before import.
 """
 
 import abc
+import hashlib
+import json
+import sys
+from pathlib import Path
 
+from django.core.management.sql import emit_post_migrate_signal
 from django.db import connections
+from django.db.migrations.loader import MigrationLoader
 from django.db.migrations.recorder import MigrationRecorder
 
+from .deferred_constraints import DeferredConstraints
+from .engine import (
+    get_saved_schema_fingerprint,
+    get_schema_fingerprint,
+    get_schema_models,
+)
+from .manifest import get_content_fingerprint
 from .settings import settings
-from .utils import nodb_cursor
+from .utils import (
+    find_file,
+    flush_tables,
+    migrations_file_path,
+    nodb_cursor,
+    open_file,
+)
 
 MODES = {}
 
@@ -31,6 +50,26 @@ class Reset(abc.ABC):
     def reset_database(self, django_dbname: str) -> None:
         raise NotImplementedError
 
+    def restore_snapshot(self, django_dbname: str, src: Path) -> bool:
+        """
+        Restore the database from a snapshot of a previous import of `src`,
+        returning whether it was restored. When it is, the import is complete.
+        """
+        return False
+
+    def reset_data(self, django_dbname: str, src: Path) -> bool:
+        """
+        Empty the database while keeping its schema, returning whether it was
+        emptied. When it isn't, `reset_database` is used and the schema is
+        imported again.
+        """
+        return False
+
+    def save_snapshot(self, django_dbname: str, src: Path) -> None:
+        raise NotImplementedError(
+            "The {} reset mode doesn't support snapshots".format(self.slug),
+        )
+
     def __str__(self) -> str:
         # Use the slug as the str for easier integration into the CLI
         return self.slug
@@ -67,6 +106,127 @@ class DropDatabaseReset(Reset):
             )
 
 
+def get_migrations_fingerprint() -> str:
+    """
+    A hash identifying the content of the migrations in the codebase.
+    """
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    migrations_hash = hashlib.sha256()
+    for key, migration in sorted(loader.disk_migrations.items()):
+        migrations_hash.update(json.dumps(key).encode())
+        module_file = getattr(
+            sys.modules[migration.__module__], "__file__", None
+        )
+        if module_file is not None:
+            migrations_hash.update(Path(module_file).read_bytes())
+    return migrations_hash.hexdigest()
+
+
+def get_snapshot_fingerprint(django_dbname: str, src: Path) -> str:
+    """
+    A hash identifying the content of an export, the schema of the models and
+    the migrations in the codebase, which a snapshot of an import must match
+    to be reused. The manifest's hashes are only trusted for files which
+    haven't changed since it was written, so that changes to them aren't
+    missed.
+    """
+    with open_file(find_file(migrations_file_path(src))) as f:
+        migrations = json.load(f)
+
+    content = json.dumps(
+        [
+            get_content_fingerprint(src),
+            get_schema_fingerprint(django_dbname, migrations),
+            get_migrations_fingerprint(),
+        ],
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class TemplateDatabaseReset(DropDatabaseReset):
+    """
+    Drop the entire database and re-create it, as with `drop-database`, but
+    re-create it from a snapshot of a previous import where possible.
+
+    Snapshots are saved as Postgres template databases after an import run with
+    `--snapshot`, and are restored with `CREATE DATABASE ... TEMPLATE` for as
+    long as the export being imported and the codebase's migrations are
+    unchanged. This requires the same privileges as `drop-database`, and that
+    there are no other connections to the database while a snapshot is saved.
+    """
+
+    slug = "template-database"
+
+    description_for_confirmation = "delete the database"
+
+    def get_template_name(self, django_dbname: str) -> str:
+        return "{}_devdata_template".format(
+            settings.DATABASES[django_dbname]["NAME"],
+        )
+
+    def get_saved_fingerprint(self, django_dbname: str):
+        connection = connections[django_dbname]
+
+        with nodb_cursor(connection) as cursor:
+            cursor.execute(
+                """
+                SELECT shobj_description(oid, 'pg_database')
+                FROM pg_database
+                WHERE datname = %s
+                """,
+                [self.get_template_name(django_dbname)],
+            )
+            row = cursor.fetchone()
+
+        return row[0] if row else None
+
+    def restore_snapshot(self, django_dbname: str, src: Path) -> bool:
+        fingerprint = self.get_saved_fingerprint(django_dbname)
+        if fingerprint is None or fingerprint != get_snapshot_fingerprint(
+            django_dbname, src
+        ):
+            return False
+
+        connection = connections[django_dbname]
+        quote_name = connection.ops.quote_name
+        pg_dbname = settings.DATABASES[django_dbname]["NAME"]
+
+        connection.close()
+        with nodb_cursor(connection) as cursor:
+            cursor.execute(
+                "DROP DATABASE IF EXISTS {}".format(quote_name(pg_dbname)),
+            )
+            cursor.execute(
+                "CREATE DATABASE {} TEMPLATE {}".format(
+                    quote_name(pg_dbname),
+                    quote_name(self.get_template_name(django_dbname)),
+                ),
+            )
+
+        return True
+
+    def save_snapshot(self, django_dbname: str, src: Path) -> None:
+        connection = connections[django_dbname]
+        quote_name = connection.ops.quote_name
+        pg_dbname = settings.DATABASES[django_dbname]["NAME"]
+        template_name = quote_name(self.get_template_name(django_dbname))
+
+        # A database can't be used as a template while it has connections.
+        connection.close()
+        with nodb_cursor(connection) as cursor:
+            cursor.execute("DROP DATABASE IF EXISTS {}".format(template_name))
+            cursor.execute(
+                "CREATE DATABASE {} TEMPLATE {}".format(
+                    template_name,
+                    quote_name(pg_dbname),
+                ),
+            )
+            cursor.execute(
+                "COMMENT ON DATABASE {} IS %s".format(template_name),
+                [get_snapshot_fingerprint(django_dbname, src)],
+            )
+
+
 class DropTablesReset(Reset):
     """
     Drop all the tables which Django knows about, including migration history.
@@ -106,6 +266,105 @@ class DropTablesReset(Reset):
                     editor.delete_model(model)
 
 
+class TruncateReset(DropTablesReset):
+    """
+    Empty all the tables which Django knows about, keeping the schema in place.
+
+    This is suitable for repeated imports into a database whose schema is
+    already up to date: the tables are emptied in a single `TRUNCATE ...
+    RESTART IDENTITY CASCADE` on Postgres (or the closest equivalent on other
+    databases), and the schema doesn't need to be imported again.
+
+    The schema is only kept if it was imported by devdata from models with the
+    same schema fingerprint, the migrations recorded in the database are those
+    of the export being imported, and each table has the columns its model
+    expects. Otherwise this falls back to dropping the tables as `drop-tables`
+    does.
+    """
+
+    slug = "truncate"
+
+    description_for_confirmation = "delete all data in the database"
+
+    def schema_matches(self, django_dbname: str, src: Path) -> bool:
+        connection = connections[django_dbname]
+
+        recorder = MigrationRecorder(connection)
+        if not recorder.has_table():
+            return False
+
+        # Indexes and constraints are missing from an import which was
+        # interrupted before restoring them.
+        if DeferredConstraints(django_dbname).exists():
+            return False
+
+        with open_file(find_file(migrations_file_path(src))) as f:
+            migrations = json.load(f)
+
+        # Changes to column types, nullability, defaults or indexes aren't
+        # visible in the migrations' names or the columns' names.
+        if get_saved_schema_fingerprint(
+            django_dbname,
+        ) != get_schema_fingerprint(django_dbname, migrations):
+            return False
+
+        if set(recorder.applied_migrations()) != {
+            (x["app"], x["name"]) for x in migrations
+        }:
+            return False
+
+        with connection.cursor() as cursor:
+            table_names = set(connection.introspection.table_names(cursor))
+
+            for model in get_schema_models(
+                django_dbname,
+                include_auto_created=True,
+            ):
+                db_table = model._meta.db_table
+                if db_table not in table_names:
+                    return False
+
+                columns = {
+                    x.name
+                    for x in connection.introspection.get_table_description(
+                        cursor,
+                        db_table,
+                    )
+                }
+                expected_columns = {
+                    x.column for x in model._meta.local_fields if x.column
+                }
+                if columns != expected_columns:
+                    return False
+
+        return True
+
+    def reset_data(self, django_dbname: str, src: Path) -> bool:
+        if not self.schema_matches(django_dbname, src):
+            return False
+
+        flush_tables(
+            connections[django_dbname],
+            [
+                x._meta.db_table
+                for x in get_schema_models(
+                    django_dbname,
+                    include_auto_created=True,
+                )
+            ],
+        )
+
+        # Recreate the data which would be created after migrating, such as
+        # content types, as `import_schema` would.
+        emit_post_migrate_signal(
+            verbosity=0,
+            interactive=False,
+            db=django_dbname,
+        )
+
+        return True
+
+
 class NoReset(Reset):
     """
     Perform no resetting against the database.
@@ -1,13 +1,35 @@
+import os
+import threading
+from pathlib import Path
+from types import MappingProxyType
 from typing import Any
 
 from django.conf import settings as django_settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.functional import cached_property
 from django.utils.module_loading import import_string
 
-from .utils import get_all_models, to_app_model_label
+from .utils import (
+    COMPRESSIONS,
+    get_all_models,
+    get_dependency_graph,
+    get_dependency_levels,
+    to_app_model_label,
+)
 
 DEFAULT_FIELD_ANONYMISERS = {}
 DEFAULT_MODEL_ANONYMISERS = {}
 DEFAULT_FAKER_LOCALES = ["en_US"]
+DEFAULT_EXPORT_COMPRESSION = None
+DEFAULT_ANONYMISATION_KEY = None
+DEFAULT_ANONYMISATION_STORE = None
+DEFAULT_SCHEMA_CACHE_DIR = (
+    Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    / "django-devdata"
+    / "schema"
+)
 
 
 def import_strategy(strategy):
@@ -19,65 +41,198 @@ def import_strategy(strategy):
         return strategy
 
 
-class Settings:
-    @property
-    def strategies(self):
-        model_strategies = django_settings.DEVDATA_STRATEGIES
+def resolve_strategies():
+    model_strategies = django_settings.DEVDATA_STRATEGIES
+
+    ret = {}
 
-        ret = {}
+    for model in get_all_models():
+        if model._meta.abstract:
+            continue
+
+        app_model_label = to_app_model_label(model)
+
+        ret[app_model_label] = []
+        strategies = model_strategies.get(app_model_label)
+
+        if strategies is None:
+            default_strategy = getattr(
+                django_settings,
+                "DEVDATA_DEFAULT_STRATEGY",
+                None,
+            )
+            if default_strategy is not None:
+                ret[app_model_label] = [default_strategy]
+        else:
+            for strategy in strategies:
+                ret[app_model_label].append(
+                    import_strategy(strategy),
+                )
 
-        for model in get_all_models():
-            if model._meta.abstract:
-                continue
+    return ret
 
-            app_model_label = to_app_model_label(model)
 
-            ret[app_model_label] = []
-            strategies = model_strategies.get(app_model_label)
+class Configuration:
+    """
+    The devdata configuration resolved from Django settings once, so that the
+    same strategy instances are used throughout a run.
+    """
 
-            if strategies is None:
-                default_strategy = getattr(
+    def __init__(self):
+        self.strategies = MappingProxyType(
+            {
+                app_model_label: tuple(strategies)
+                for app_model_label, strategies in resolve_strategies().items()
+            }
+        )
+        self.extra_strategies = tuple(
+            import_strategy(x)
+            for x in getattr(django_settings, "DEVDATA_EXTRA_STRATEGIES", ())
+        )
+        self.field_anonymisers = MappingProxyType(
+            dict(
+                getattr(
                     django_settings,
-                    "DEVDATA_DEFAULT_STRATEGY",
-                    None,
+                    "DEVDATA_FIELD_ANONYMISERS",
+                    DEFAULT_FIELD_ANONYMISERS,
                 )
-                if default_strategy is not None:
-                    ret[app_model_label] = [default_strategy]
-            else:
-                for strategy in strategies:
-                    ret[app_model_label].append(
-                        import_strategy(strategy),
+            )
+        )
+        self.model_anonymisers = MappingProxyType(
+            {
+                app_model_label: MappingProxyType(dict(anonymisers))
+                for app_model_label, anonymisers in getattr(
+                    django_settings,
+                    "DEVDATA_MODEL_ANONYMISERS",
+                    DEFAULT_MODEL_ANONYMISERS,
+                ).items()
+            }
+        )
+
+    @cached_property
+    def dependency_graph(self):
+        return get_dependency_graph(self.strategies)
+
+    @cached_property
+    def dependency_levels(self):
+        return tuple(
+            tuple(level)
+            for level in get_dependency_levels(self.dependency_graph)
+        )
+
+    @cached_property
+    def sorted_strategies(self):
+        return tuple(
+            (app_model_label, strategy)
+            for level in self.dependency_levels
+            for app_model_label in level
+            for strategy in self.strategies[app_model_label]
+        )
+
+
+class Settings:
+    def __init__(self):
+        self._configuration = None
+        self._configuration_loading = False
+        # Re-entrant, as loading the configuration imports user code which may
+        # itself access the settings.
+        self._configuration_lock = threading.RLock()
+
+    @property
+    def configuration(self) -> Configuration:
+        with self._configuration_lock:
+            if self._configuration is None:
+                if self._configuration_loading:
+                    raise RuntimeError(
+                        "The devdata configuration was accessed while it was "
+                        "being loaded, e.g. by a strategy's constructor.",
                     )
 
-        return ret
+                self._configuration_loading = True
+                try:
+                    self._configuration = Configuration()
+                finally:
+                    self._configuration_loading = False
+            return self._configuration
+
+    def clear_configuration(self) -> None:
+        with self._configuration_lock:
+            self._configuration = None
+
+    @property
+    def strategies(self):
+        return self.configuration.strategies
+
+    @property
+    def sorted_strategies(self):
+        return self.configuration.sorted_strategies
+
+    @property
+    def dependency_graph(self):
+        return self.configuration.dependency_graph
+
+    @property
+    def dependency_levels(self):
+        return self.configuration.dependency_levels
 
     @property
     def extra_strategies(self):
-        return [
-            import_strategy(x)
-            for x in getattr(django_settings, "DEVDATA_EXTRA_STRATEGIES", ())
-        ]
+        return self.configuration.extra_strategies
 
     @property
     def field_anonymisers(self):
+        return self.configuration.field_anonymisers
+
+    @property
+    def model_anonymisers(self):
+        return self.configuration.model_anonymisers
+
+    @property
+    def faker_locales(self):
         return getattr(
+            django_settings, "DEVDATA_FAKER_LOCALES", DEFAULT_FAKER_LOCALES
+        )
+
+    @property
+    def export_compression(self):
+        compression = getattr(
             django_settings,
-            "DEVDATA_FIELD_ANONYMISERS",
-            DEFAULT_FIELD_ANONYMISERS,
+            "DEVDATA_EXPORT_COMPRESSION",
+            DEFAULT_EXPORT_COMPRESSION,
         )
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ImproperlyConfigured(
+                "DEVDATA_EXPORT_COMPRESSION must be one of: None, {}".format(
+                    ", ".join(repr(x) for x in COMPRESSIONS),
+                ),
+            )
+        return compression
 
     @property
-    def model_anonymisers(self):
+    def anonymisation_key(self):
+        key = getattr(
+            django_settings,
+            "DEVDATA_ANONYMISATION_KEY",
+            DEFAULT_ANONYMISATION_KEY,
+        )
+        if isinstance(key, str):
+            return key.encode()
+        return key
+
+    @property
+    def anonymisation_store(self):
         return getattr(
             django_settings,
-            "DEVDATA_MODEL_ANONYMISERS",
-            DEFAULT_MODEL_ANONYMISERS,
+            "DEVDATA_ANONYMISATION_STORE",
+            DEFAULT_ANONYMISATION_STORE,
         )
 
     @property
-    def faker_locales(self):
+    def schema_cache_dir(self):
         return getattr(
-            django_settings, "DEVDATA_FAKER_LOCALES", DEFAULT_FAKER_LOCALES
+            django_settings,
+            "DEVDATA_SCHEMA_CACHE_DIR",
+            DEFAULT_SCHEMA_CACHE_DIR,
         )
 
     def __getattr__(self, name: str) -> Any:
@@ -85,3 +240,9 @@ class Settings:
 
 
 settings = Settings()
+
+
+@receiver(setting_changed)
+def clear_configuration(*, setting, **_kwargs):
+    if setting.startswith("DEVDATA_"):
+        settings.clear_configuration()
@@ -1,14 +1,52 @@
+import array
+import contextlib
+import itertools
 from typing import Set, Tuple
 
 from django.core import serializers
-from django.db import models
-
-from .pii_anonymisation import PiiAnonymisingSerializer
+from django.core.serializers.python import Deserializer as PythonDeserializer
+from django.db import connections, models, transaction
+from django.db.models import Max
+from django.db.models.expressions import RawSQL
+
+from .pii_anonymisation import (
+    PiiAnonymisingJSONLSerializer,
+    PiiAnonymisingSerializer,
+)
+from .postgres import (
+    copy_objects,
+    copy_to_jsonl,
+    is_postgres,
+    supports_copy,
+    supports_copy_export,
+)
+from .settings import settings
 from .utils import (
-    get_exported_pks_for_model,
+    EXPORT_FORMATS,
+    PkIndexBuilder,
+    accepts_keyword,
+    batched,
+    delete_export_progress,
+    find_file,
+    get_exported_pk_index,
+    get_referencing_models,
+    get_shard_files,
     is_empty_iterator,
+    iter_exported_objects,
+    open_file,
+    pk_index_file,
+    read_export_progress,
+    read_watermark,
+    shard_file,
+    temporary_file,
     to_app_model_label,
     to_model,
+    watermark_file,
+    with_compression,
+    write_export_progress,
+    write_exported_objects,
+    write_pk_index,
+    write_watermark,
 )
 
 
@@ -36,6 +74,8 @@ class Exportable:
 
     seen_names = set()  # type: Set[Tuple[str, str]]
 
+    data_format = "json"
+
     def __init__(self, *args, name, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -56,7 +96,40 @@ class Exportable:
         pass
 
     def data_file(self, dest, app_model_label):
-        return dest / app_model_label / "{}.json".format(self.name)
+        return with_compression(
+            dest
+            / app_model_label
+            / "{}{}".format(self.name, EXPORT_FORMATS[self.data_format]),
+            settings.export_compression,
+        )
+
+    def find_data_file(self, dest, app_model_label):
+        """
+        Find the existing data file for this strategy, which may have been
+        exported in a different format or compression to the one currently
+        configured.
+        """
+        data_file = self.data_file(dest, app_model_label)
+        if data_file.exists():
+            return data_file
+
+        for suffix in EXPORT_FORMATS.values():
+            candidate = find_file(data_file.with_name(self.name + suffix))
+            if candidate.exists():
+                return candidate
+
+        return data_file
+
+    def find_data_files(self, dest, app_model_label):
+        """
+        Find the existing data files for this strategy, either a single data
+        file or the shards of a sharded export.
+        """
+        data_file = self.find_data_file(dest, app_model_label)
+        if data_file.exists():
+            return [data_file]
+
+        return get_shard_files(dest / app_model_label, self.name)
 
     def ensure_dir_exists(self, dest, app_model_label):
         unique_key = (app_model_label, self.name)
@@ -79,9 +152,51 @@ class QuerySetStrategy(Exportable, Strategy):
 
     json_indent = 2
 
-    def __init__(self, *args, anonymise=True, **kwargs):
+    # Whether `import_data` takes a `checkpoint` to record its progress in, so
+    # that interrupted imports can be resumed part way through.
+    supports_checkpoints = True
+
+    def __init__(
+        self,
+        *args,
+        anonymise=True,
+        data_format="json",
+        import_batch_size=1000,
+        use_copy=True,
+        export_with_copy=False,
+        watermark=None,
+        shard_size=None,
+        page_size=None,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.anonymise = anonymise
+        self.watermark = watermark
+        self.shard_size = shard_size
+        self.page_size = page_size
+        self.import_batch_size = import_batch_size
+        self.use_copy = use_copy
+        self.export_with_copy = export_with_copy
+
+        if data_format not in EXPORT_FORMATS:
+            raise ValueError(
+                "Unknown data format {!r}, expected one of: {}".format(
+                    data_format,
+                    ", ".join(EXPORT_FORMATS),
+                ),
+            )
+        self.data_format = data_format
+
+        if export_with_copy and data_format != "jsonl":
+            raise ValueError(
+                "Exporting with COPY writes JSON Lines, use data_format='jsonl'.",
+            )
+
+        if shard_size is not None and (export_with_copy or watermark):
+            raise ValueError(
+                "Sharded exports can't be combined with export_with_copy or "
+                "watermark.",
+            )
 
     def get_restricted_pks(self, dest, model):
         restricted_pks = {}
@@ -94,13 +209,70 @@ class QuerySetStrategy(Exportable, Strategy):
                 continue
 
             app_model_label = to_app_model_label(field.related_model)
-            restricted_pks[app_model_label] = get_exported_pks_for_model(
+            restricted_pks[app_model_label] = get_exported_pk_index(
                 dest,
                 field.related_model,
             )
 
         return restricted_pks
 
+    def get_exported_object_filter(self, dest, model):
+        """
+        Get a function which checks whether an exported object of the model
+        still meets the restrictions on its foreign keys, or None if that
+        can't be checked because they're serialized as natural keys.
+        """
+        restrictions = []
+
+        for app_model_label, restrict_pks in self.get_restricted_pks(
+            dest,
+            model,
+        ).items():
+            restrict_model = to_model(app_model_label)
+            if self.use_natural_foreign_keys and hasattr(
+                restrict_model,
+                "natural_key",
+            ):
+                return None
+
+            # Primary keys which aren't all integers are indexed as strings.
+            as_str = not isinstance(restrict_pks, array.array)
+            allowed_pks = set(restrict_pks)
+
+            restrictions.extend(
+                (x.name, allowed_pks, as_str)
+                for x in model._meta.fields
+                if x.related_model == restrict_model
+            )
+
+        def is_allowed(obj):
+            for name, allowed_pks, as_str in restrictions:
+                value = obj["fields"].get(name)
+                if value is None:
+                    continue
+                if (str(value) if as_str else value) not in allowed_pks:
+                    return False
+            return True
+
+        return is_allowed
+
+    def get_restriction(self, django_dbname, field, restrict_pks):
+        """
+        Get the values to restrict a foreign key field to for `field__in`.
+
+        On Postgres the primary keys are passed as a single array which is
+        semi-joined against, so the size of the query and the number of
+        parameters don't grow with the number of primary keys.
+        """
+        connection = connections[django_dbname]
+        if not is_postgres(connection):
+            return restrict_pks
+
+        return RawSQL(
+            "SELECT unnest(%s::{}[])".format(field.db_type(connection)),
+            (list(restrict_pks),),
+        )
+
     def get_queryset(self, django_dbname, dest, model):
         queryset = model.objects.using(django_dbname)
 
@@ -125,7 +297,13 @@ class QuerySetStrategy(Exportable, Strategy):
                         **{x.attname: None},
                     )
                     | models.Q(
-                        **{"{}__in".format(x.attname): restrict_pks},
+                        **{
+                            "{}__in".format(x.attname): self.get_restriction(
+                                django_dbname,
+                                x,
+                                restrict_pks,
+                            ),
+                        },
                     )
                     for x in fk_fields
                 ]
@@ -133,6 +311,14 @@ class QuerySetStrategy(Exportable, Strategy):
 
         return queryset
 
+    def get_serializer(self, dest):
+        if self.anonymise:
+            if self.data_format == "jsonl":
+                return PiiAnonymisingJSONLSerializer(dest=dest)
+            return PiiAnonymisingSerializer(dest=dest)
+
+        return serializers.get_serializer(self.data_format)()
+
     def export_data(
         self,
         django_dbname,
@@ -144,56 +330,392 @@ class QuerySetStrategy(Exportable, Strategy):
         app_model_label = to_app_model_label(model)
         data_file = self.data_file(dest, app_model_label)
 
-        if no_update and data_file.exists():
+        if (
+            no_update
+            and self.find_data_files(dest, app_model_label)
+            and read_export_progress(data_file) is None
+        ):
             return
 
         self.ensure_dir_exists(dest, app_model_label)
 
+        # Remove any export from a previous run in a different format or with
+        # different sharding so that it isn't picked up alongside the new one.
+        previous_data_files = self.find_data_files(dest, app_model_label)
+        for previous_data_file in previous_data_files:
+            if self.shard_size is not None or previous_data_file != data_file:
+                previous_data_file.unlink()
+
+                previous_pk_index_file = pk_index_file(previous_data_file)
+                if (
+                    previous_pk_index_file != pk_index_file(data_file)
+                    and previous_pk_index_file.exists()
+                ):
+                    previous_pk_index_file.unlink()
+
         queryset = self.get_queryset(django_dbname, dest, model)
 
-        serializer = (
-            PiiAnonymisingSerializer(dest=dest)
-            if self.anonymise
-            else serializers.get_serializer("json")
+        if self.shard_size is not None:
+            queryset_is_empty = self.export_shards(
+                dest,
+                queryset,
+                data_file,
+            )
+        elif self.watermark is None:
+            pk_index, queryset_is_empty = self.write_data_file(
+                django_dbname,
+                dest,
+                model,
+                queryset,
+                data_file,
+            )
+            write_pk_index(data_file, pk_index.pks)
+        else:
+            queryset_is_empty = self.export_incrementally(
+                django_dbname,
+                dest,
+                model,
+                queryset,
+                data_file,
+                previous_data_files == [data_file],
+            )
+
+        if queryset_is_empty:
+            log(
+                "Warning! '{}' exporter for {} selected no data.".format(
+                    self.name,
+                    app_model_label,
+                )
+            )
+
+    def serialize(self, dest, objects, output):
+        self.get_serializer(dest).serialize(
+            objects,
+            indent=self.json_indent,
+            use_natural_foreign_keys=self.use_natural_foreign_keys,
+            use_natural_primary_keys=self.use_natural_primary_keys,
+            stream=output,
         )
 
-        with data_file.open("w") as output:
-            iterator, queryset_is_empty = is_empty_iterator(queryset.iterator())
-            if queryset_is_empty:
-                log(
-                    "Warning! '{}' exporter for {} selected no data.".format(
-                        self.name,
-                        app_model_label,
-                    )
+    def write_data_file(self, django_dbname, dest, model, queryset, data_file):
+        """
+        Write the rows of the queryset to a data file, returning the index of
+        their primary keys and whether there were none.
+        """
+        if self.page_size is not None and self.data_format == "jsonl":
+            return self.export_pages(
+                django_dbname,
+                dest,
+                model,
+                queryset,
+                data_file,
+            )
+
+        pk_index = PkIndexBuilder()
+        export_with_copy = self.can_export_with_copy(django_dbname, model)
+
+        with open_file(data_file, "w") as output:
+            if export_with_copy:
+                queryset_is_empty = not copy_to_jsonl(
+                    connections[django_dbname],
+                    queryset,
+                    output,
                 )
+            else:
+                iterator, queryset_is_empty = is_empty_iterator(
+                    self.iterate_queryset(queryset),
+                )
+                self.serialize(dest, pk_index.track(iterator), output)
+
+        if export_with_copy:
+            # The rows were serialized by the database, read back their primary
+            # keys for the index.
+            pk_index.extend(x["pk"] for x in iter_exported_objects(data_file))
+
+        return pk_index, queryset_is_empty
+
+    def iterate_queryset(self, queryset):
+        if self.page_size is None:
+            return queryset.iterator()
+
+        return itertools.chain.from_iterable(self.iterate_pages(queryset))
+
+    def iterate_pages(self, queryset, last_pk=None):
+        """
+        Iterate the rows of the queryset a page at a time, in primary key
+        order. Each page is fetched with its own query, filtered to primary
+        keys after the last row of the previous page, so that no cursor is
+        held open between pages.
+        """
+        if queryset.query.is_sliced:
+            raise ValueError("Paginated exports can't use sliced querysets.")
+
+        queryset = queryset.order_by("pk")
+        while True:
+            page_queryset = queryset
+            if last_pk is not None:
+                page_queryset = page_queryset.filter(pk__gt=last_pk)
 
-            serializer.serialize(
-                iterator,
-                indent=self.json_indent,
-                use_natural_foreign_keys=self.use_natural_foreign_keys,
-                use_natural_primary_keys=self.use_natural_primary_keys,
-                stream=output,
+            page = list(page_queryset[: self.page_size])
+            if not page:
+                return
+
+            yield page
+            last_pk = page[-1].pk
+
+    def export_pages(self, django_dbname, dest, model, queryset, data_file):
+        """
+        Write the rows of the queryset to a JSON Lines data file a page at a
+        time, recording progress after each page so that a failed export can
+        continue from the last complete page when it's run again.
+        """
+        export_with_copy = self.can_export_with_copy(django_dbname, model)
+        pk_index = PkIndexBuilder()
+
+        progress = read_export_progress(data_file)
+        if progress is None:
+            last_pk = None
+            with open_file(data_file, "w"):
+                pass
+        else:
+            # Discard anything written after the last complete page.
+            with data_file.open("r+b") as f:
+                f.truncate(progress["data_size"])
+            pk_index.extend(x["pk"] for x in iter_exported_objects(data_file))
+            last_pk = model._meta.pk.to_python(progress["pk"])
+
+        pages = self.iterate_pages(
+            queryset.only("pk") if export_with_copy else queryset,
+            last_pk,
+        )
+        for page in pages:
+            with open_file(data_file, "a") as output:
+                if export_with_copy:
+                    copy_to_jsonl(
+                        connections[django_dbname],
+                        queryset.filter(
+                            pk__gte=page[0].pk,
+                            pk__lte=page[-1].pk,
+                        ),
+                        output,
+                    )
+                else:
+                    self.serialize(dest, page, output)
+
+            pk_index.extend(x.pk for x in page)
+            write_export_progress(data_file, page[-1].pk)
+
+        delete_export_progress(data_file)
+        return pk_index, not pk_index.pks
+
+    def export_shards(self, dest, queryset, data_file):
+        """
+        Write the rows of the queryset to numbered shards of the data file, of
+        at most `shard_size` rows each. Returns whether there were no rows.
+        """
+        iterator = self.iterate_queryset(queryset)
+
+        for index in itertools.count():
+            objects, shard_is_empty = is_empty_iterator(
+                itertools.islice(iterator, self.shard_size),
             )
 
-    def import_data(self, django_dbname, src, model):
+            # Always write the first shard, so that empty exports still exist.
+            if shard_is_empty and index:
+                return False
+
+            pk_index = PkIndexBuilder()
+            shard = shard_file(data_file, index)
+            with open_file(shard, "w") as output:
+                self.serialize(dest, pk_index.track(objects), output)
+            write_pk_index(shard, pk_index.pks)
+
+            if shard_is_empty:
+                return True
+
+    def export_incrementally(
+        self,
+        django_dbname,
+        dest,
+        model,
+        queryset,
+        data_file,
+        can_merge,
+    ):
+        """
+        Export the rows of the queryset past the watermark recorded for the
+        previous export, merging them into it, or all rows if there's no
+        previous export to merge into. Returns whether no rows were exported.
+        """
+        if queryset.query.is_sliced:
+            raise ValueError(
+                "Incremental exports can't be used with sliced querysets.",
+            )
+
+        field = model._meta.get_field(self.watermark)
+
+        # Bound the export by the current watermark, so that rows written
+        # during the export are picked up by the next one.
+        watermark = queryset.aggregate(watermark=Max(field.attname))[
+            "watermark"
+        ]
+        if watermark is not None:
+            queryset = queryset.filter(
+                **{"{}__lte".format(field.attname): watermark},
+            )
+
+        # Rows kept from the previous export must still meet the foreign key
+        # restrictions, as the related models' exports may have shrunk since.
+        is_allowed = self.get_exported_object_filter(dest, model)
+
+        previous_watermark = (
+            read_watermark(data_file)
+            if can_merge and is_allowed is not None
+            else None
+        )
+
+        if previous_watermark is None:
+            pk_index, queryset_is_empty = self.write_data_file(
+                django_dbname,
+                dest,
+                model,
+                queryset,
+                data_file,
+            )
+        else:
+            queryset = queryset.filter(
+                **{
+                    "{}__gt".format(field.attname): field.to_python(
+                        previous_watermark,
+                    ),
+                },
+            )
+            delta_file = temporary_file(data_file, "delta")
+            merged_file = temporary_file(data_file, "merged")
+
+            self.write_data_file(
+                django_dbname,
+                dest,
+                model,
+                queryset,
+                delta_file,
+            )
+
+            # Rows in the delta replace those with the same primary key.
+            replaced_pks = {x["pk"] for x in iter_exported_objects(delta_file)}
+            objects = itertools.chain(
+                (
+                    x
+                    for x in iter_exported_objects(data_file)
+                    if x["pk"] not in replaced_pks and is_allowed(x)
+                ),
+                iter_exported_objects(delta_file),
+            )
+
+            pk_index = PkIndexBuilder()
+            with open_file(merged_file, "w") as output:
+                write_exported_objects(
+                    output,
+                    pk_index.track_exported(objects),
+                    self.data_format,
+                    indent=self.json_indent,
+                )
+
+            merged_file.replace(data_file)
+            delta_file.unlink()
+            with contextlib.suppress(OSError):
+                delta_file.parent.rmdir()
+            queryset_is_empty = not pk_index.pks
+
+            if watermark is None:
+                watermark = previous_watermark
+
+        write_pk_index(data_file, pk_index.pks)
+        if watermark is not None:
+            write_watermark(data_file, watermark)
+        elif watermark_file(data_file).exists():
+            watermark_file(data_file).unlink()
+
+        return queryset_is_empty
+
+    def can_export_with_copy(self, django_dbname, model):
+        """
+        Whether to have the database serialize the data directly. This skips
+        the per-row Python overhead, but is only possible for data that isn't
+        anonymised and doesn't use natural keys.
+        """
+        return (
+            self.export_with_copy
+            and not self.anonymise
+            and not self.use_natural_foreign_keys
+            and not self.use_natural_primary_keys
+            and supports_copy_export(connections[django_dbname], model)
+        )
+
+    def import_data(self, django_dbname, src, model, checkpoint=None):
         app_model_label = to_app_model_label(model)
 
         try:
-            with self.data_file(src, app_model_label).open() as f:
-                objects = serializers.deserialize(
-                    "json", f, using=django_dbname
+            # Shards are imported in order, as one sequence of rows, so that
+            # a checkpoint's row count identifies where to resume from.
+            exported_objects = itertools.chain.from_iterable(
+                iter_exported_objects(x)
+                for x in self.find_data_files(src, app_model_label)
+            )
+            if checkpoint is not None and checkpoint.rows:
+                # Skip the rows imported before the import was interrupted.
+                exported_objects = itertools.islice(
+                    exported_objects,
+                    checkpoint.rows,
+                    None,
+                )
+
+            objects = PythonDeserializer(exported_objects, using=django_dbname)
+            if accepts_keyword(self.import_objects, "checkpoint"):
+                self.import_objects(
+                    django_dbname,
+                    src,
+                    model,
+                    objects,
+                    checkpoint=checkpoint,
                 )
+            else:
+                # Overrides predating checkpoints don't record their progress.
                 self.import_objects(django_dbname, src, model, objects)
         except Exception:
             print("Failed to import {} ({})".format(app_model_label, self.name))
             raise
 
-    def import_objects(self, django_dbname, src, model, objects):
+    def import_objects(
+        self, django_dbname, src, model, objects, checkpoint=None
+    ):
         qs = model.objects.using(django_dbname)
-        existing_pks = set(qs.values_list("pk", flat=True))
-        qs.bulk_create(
-            [x.object for x in objects if x.object.pk not in existing_pks]
-        )
+        connection = connections[django_dbname]
+        use_copy = self.use_copy and supports_copy(connection, model)
+        rows = checkpoint.rows if checkpoint is not None else 0
+
+        # Objects are decoded and inserted a batch at a time so that memory use
+        # is bounded by the batch size rather than the size of the table.
+        for batch in batched(objects, self.import_batch_size):
+            existing_pks = set(
+                qs.filter(pk__in=[x.object.pk for x in batch]).values_list(
+                    "pk",
+                    flat=True,
+                ),
+            )
+            new_objects = [
+                x.object for x in batch if x.object.pk not in existing_pks
+            ]
+
+            with transaction.atomic(using=django_dbname):
+                if use_copy and all(x.pk is not None for x in new_objects):
+                    copy_objects(connection, model, new_objects)
+                else:
+                    qs.bulk_create(new_objects)
+
+                rows += len(batch)
+                if checkpoint is not None:
+                    checkpoint.record_rows(rows)
 
 
 class ExactQuerySetStrategy(QuerySetStrategy):
@@ -268,10 +790,57 @@ class ModelReverseRelationshipQuerySetStrategy(QuerySetStrategy):
 
 
 class DeleteFirstQuerySetStrategy(QuerySetStrategy):
-    def import_objects(self, django_dbname, src, model, objects):
+    """
+    Replace the existing rows of a table with those imported.
+
+    By default the rows are deleted with Django's deletion collector, which
+    cascades to related rows in Python. Passing `fast_delete=True` instead
+    empties the table, and any tables referencing it, without loading any
+    rows: on Postgres with `TRUNCATE ... CASCADE`, and elsewhere (where Django
+    doesn't create cascading foreign keys) with a `DELETE` query for each
+    referencing table and then the table itself.
+    """
+
+    def __init__(self, *args, fast_delete=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fast_delete = fast_delete
+
+    def delete_existing(self, django_dbname, model):
         qs = model.objects.using(django_dbname)
-        qs.all().delete()
-        super().import_objects(django_dbname, src, model, objects)
+        if not self.fast_delete:
+            qs.all().delete()
+            return
+
+        connection = connections[django_dbname]
+        if is_postgres(connection):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "TRUNCATE {} CASCADE".format(
+                        connection.ops.quote_name(model._meta.db_table),
+                    ),
+                )
+        else:
+            with transaction.atomic(using=django_dbname):
+                for referencing_model in get_referencing_models(model):
+                    referencing_model._base_manager.using(
+                        django_dbname,
+                    )._raw_delete(django_dbname)
+                qs.all()._raw_delete(django_dbname)
+
+    def import_objects(
+        self, django_dbname, src, model, objects, checkpoint=None
+    ):
+        # When resuming, the rows already imported must be kept.
+        if checkpoint is None or not checkpoint.rows:
+            self.delete_existing(django_dbname, model)
+
+        super().import_objects(
+            django_dbname,
+            src,
+            model,
+            objects,
+            checkpoint=checkpoint,
+        )
 
 
 class FactoryStrategy(Strategy):
@@ -1,13 +1,35 @@
+import array
+import collections
+import concurrent.futures
 import contextlib
 import functools
+import gzip
+import hashlib
+import inspect
 import itertools
 import json
-from typing import Iterator, Optional, Tuple, TypeVar
+import re
+import sys
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 import django
 import tqdm
 from django.apps import apps
 from django.conf import settings as django_settings
+from django.core.management.color import no_style
 from django.db.models import Model
 
 
@@ -26,19 +48,144 @@ def to_model(app_model_label: str) -> Optional[Model]:
         return None
 
 
+def accepts_keyword(func, name: str) -> bool:
+    """
+    Whether a function can be passed the given keyword argument, so that
+    arguments added to extension points don't break existing overrides.
+    """
+    return any(
+        x.kind == x.VAR_KEYWORD
+        or (
+            x.name == name
+            and x.kind in (x.POSITIONAL_OR_KEYWORD, x.KEYWORD_ONLY)
+        )
+        for x in inspect.signature(func).parameters.values()
+    )
+
+
 def get_all_models():
     return apps.get_models(include_auto_created=True)
 
 
+def get_referencing_models(model) -> List[Model]:
+    """
+    Get the models with foreign keys to the given model, directly or through
+    other referencing models, ordered so that each comes before any models it
+    references.
+    """
+    referencing_models = []
+    seen = {model}
+
+    def visit(target):
+        for candidate in get_all_models():
+            if candidate in seen or candidate._meta.proxy:
+                continue
+
+            if any(
+                field.related_model is target
+                for field in candidate._meta.local_fields
+                if field.is_relation
+            ):
+                seen.add(candidate)
+                visit(candidate)
+                referencing_models.append(candidate)
+
+    visit(model)
+    return referencing_models
+
+
 def migrations_file_path(dir):
     return dir / "migrations.json"
 
 
-def progress(sequence):
-    return tqdm.tqdm(sequence)
+# The file suffix used for each of the compression formats that exports may be
+# written with.
+COMPRESSIONS = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
 
 
-def sort_model_strategies(model_strategies):
+def get_compression(path) -> Optional[str]:
+    for compression, suffix in COMPRESSIONS.items():
+        if path.name.endswith(suffix):
+            return compression
+    return None
+
+
+def with_compression(path, compression: Optional[str]):
+    """
+    Get the path for a file compressed with the given compression, which may be
+    `None` for no compression.
+    """
+    current = get_compression(path)
+    if current is not None:
+        path = path.with_name(path.name[: -len(COMPRESSIONS[current])])
+
+    if compression is None:
+        return path
+
+    return path.with_name(path.name + COMPRESSIONS[compression])
+
+
+def find_file(path):
+    """
+    Find the existing file at `path`, or a variant of it using a different
+    compression. Returns `path` if no such file exists.
+    """
+    for candidate in (
+        path,
+        with_compression(path, None),
+        *(with_compression(path, x) for x in COMPRESSIONS),
+    ):
+        if candidate.exists():
+            return candidate
+    return path
+
+
+def remove_other_compressions(path):
+    """
+    Remove any existing variants of the file at `path` using a different
+    compression, so that `find_file` doesn't pick up a stale one instead.
+    """
+    for candidate in (
+        with_compression(path, None),
+        *(with_compression(path, x) for x in COMPRESSIONS),
+    ):
+        if candidate != path and candidate.exists():
+            candidate.unlink()
+
+
+def open_file(path, mode="r"):
+    """
+    Open a file in text mode, streaming (de)compression based on its suffix.
+    """
+    compression = get_compression(path)
+
+    if compression == "gzip":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError(
+                "The 'zstandard' package is required for zstd compression.",
+            ) from e
+
+        return zstandard.open(path, mode + "t", encoding="utf-8")
+
+    return path.open(mode)
+
+
+def progress(sequence=None, **kwargs):
+    return tqdm.tqdm(sequence, **kwargs)
+
+
+T = TypeVar("T")
+
+
+def get_model_dependencies(model_strategies):
     model_dependencies = []
     models = set()
 
@@ -73,49 +220,598 @@ def sort_model_strategies(model_strategies):
 
         model_dependencies.append((model, deps))
 
-    model_dependencies.reverse()
-
-    model_list = []
-    while model_dependencies:
-        skipped = []
-        changed = False
-        while model_dependencies:
-            model, deps = model_dependencies.pop()
-
-            # If all of the models in the dependency list are either already
-            # on the final model list, or not on the original serialization list,
-            # then we've found another model with all it's dependencies satisfied.
-            if all(d not in models or d in model_list for d in deps):
-                model_list.append(model)
-                changed = True
-            else:
-                skipped.append((model, deps))
-        if not changed:
-            raise RuntimeError(
-                "Can't resolve dependencies for {} in serialized app list.".format(
-                    ", ".join(
-                        "{}.{}".format(
-                            model._meta.app_label, model._meta.object_name
-                        )
-                        for model, _ in sorted(
-                            skipped, key=lambda obj: obj[0].__name__
-                        )
-                    ),
-                ),
-            )
+    return models, model_dependencies
+
+
+def get_dependency_graph(model_strategies) -> Dict[str, Set[str]]:
+    """
+    Map each app model label to the labels of the other models in
+    `model_strategies` which must be handled before it.
+    """
+    models, model_dependencies = get_model_dependencies(model_strategies)
+    return {
+        to_app_model_label(model): {
+            to_app_model_label(dep)
+            for dep in deps
+            if dep in models and dep != model
+        }
+        for model, deps in model_dependencies
+    }
+
+
+def find_dependency_cycle(dependency_graph: Mapping[T, Set[T]]) -> List[T]:
+    """
+    Find a cycle in a dependency graph in which every node has at least one
+    dependency that's also in the graph, as a list of nodes starting and
+    ending with the same node.
+    """
+    node = next(iter(dependency_graph))
+    path = []
+    seen = {}
+    while node not in seen:
+        seen[node] = len(path)
+        path.append(node)
+        node = min(
+            (
+                x
+                for x in dependency_graph[node]
+                if x in dependency_graph and x != node
+            ),
+            key=str,
+        )
+    cycle_start = seen[node]
+    return [*path[cycle_start:], node]
+
+
+def get_dependency_levels(
+    dependency_graph: Mapping[T, Set[T]],
+) -> List[List[T]]:
+    """
+    Topologically sort a dependency graph, mapping each node to the nodes it
+    depends on, into levels. Each level depends only on earlier levels, and
+    nodes keep their relative order from the graph within a level.
+    Dependencies on nodes not in the graph are ignored.
+    """
+    indegrees = {}
+    dependents = collections.defaultdict(list)
+    for node, dependencies in dependency_graph.items():
+        dependencies = {
+            x for x in dependencies if x in dependency_graph and x != node
+        }
+        indegrees[node] = len(dependencies)
+        for dependency in dependencies:
+            dependents[dependency].append(node)
+
+    order = {node: index for index, node in enumerate(dependency_graph)}
+    levels = []
+    level = [node for node, indegree in indegrees.items() if not indegree]
+    while level:
+        levels.append(level)
+        next_level = []
+        for node in level:
+            for dependent in dependents[node]:
+                indegrees[dependent] -= 1
+                if not indegrees[dependent]:
+                    next_level.append(dependent)
+        level = sorted(next_level, key=order.__getitem__)
+
+    unresolved = {
+        node: dependency_graph[node]
+        for node, indegree in indegrees.items()
+        if indegree
+    }
+    if unresolved:
+        raise RuntimeError(
+            "Can't resolve dependencies for {}, which form a cycle: {}".format(
+                ", ".join(sorted(str(x) for x in unresolved)),
+                " -> ".join(str(x) for x in find_dependency_cycle(unresolved)),
+            ),
+        )
+
+    return levels
 
-        model_dependencies = skipped
 
+def sort_model_strategies(model_strategies):
+    levels = get_dependency_levels(get_dependency_graph(model_strategies))
     return [
-        (to_app_model_label(y), x)
-        for y in model_list
-        for x in model_strategies[to_app_model_label(y)]
+        (app_model_label, strategy)
+        for level in levels
+        for app_model_label in level
+        for strategy in model_strategies[app_model_label]
     ]
 
 
+def run_in_dependency_order(
+    tasks: Sequence[T],
+    dependencies: Dict[T, Set[T]],
+    func: Callable[[T], None],
+    workers: int,
+) -> Iterator[T]:
+    """
+    Call `func` for each of `tasks` using a pool of `workers` threads, only
+    starting a task once all of its `dependencies` have completed.
+
+    Completed tasks are yielded as they finish. Ready tasks are started in the
+    order given. If a task raises, no further tasks are started and the error
+    is re-raised once those already running have finished.
+    """
+    remaining = {
+        task: set(dependencies.get(task, ())).intersection(tasks) - {task}
+        for task in tasks
+    }
+    dependents = collections.defaultdict(list)
+    for task, deps in remaining.items():
+        for dep in deps:
+            dependents[dep].append(task)
+
+    ready = collections.deque(task for task in tasks if not remaining[task])
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        while ready or running:
+            while ready and len(running) < workers:
+                task = ready.popleft()
+                running[executor.submit(func, task)] = task
+
+            done, _ = concurrent.futures.wait(
+                running,
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for future in done:
+                task = running.pop(future)
+                future.result()
+
+                for dependent in dependents[task]:
+                    remaining[dependent].discard(task)
+                    if not remaining[dependent]:
+                        ready.append(dependent)
+
+                yield task
+
+    unfinished = [task for task in tasks if remaining[task]]
+    if unfinished:
+        raise RuntimeError(
+            "Can't resolve dependencies for {}.".format(
+                ", ".join(str(x) for x in unfinished),
+            ),
+        )
+
+
+# The file suffix used for each of the formats that data can be exported in.
+EXPORT_FORMATS = {
+    "json": ".json",
+    "jsonl": ".jsonl",
+}
+
+
+def get_export_format(data_file):
+    name = with_compression(data_file, None).name
+    for export_format, suffix in EXPORT_FORMATS.items():
+        if name.endswith(suffix):
+            return export_format
+    raise ValueError("Unknown export format for {}".format(data_file))
+
+
+def get_data_files(data_dir):
+    return sorted(
+        data_file
+        for suffix in EXPORT_FORMATS.values()
+        for compression_suffix in ("", *COMPRESSIONS.values())
+        for data_file in data_dir.glob(
+            "*{}{}".format(suffix, compression_suffix),
+        )
+    )
+
+
+WHITESPACE = re.compile(r"\s*")
+
+
+def iter_json_array(f, chunk_size=2**16):
+    """
+    Iterate the items of a JSON array from a file, decoding them incrementally
+    so that only a chunk of the file is held in memory at once.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    index = 0
+    eof = False
+    expecting = "["
+
+    def read(size):
+        nonlocal buffer, index, eof
+        chunk = f.read(size)
+        buffer = buffer[index:] + chunk
+        index = 0
+        eof = not chunk
+
+    while True:
+        index = WHITESPACE.match(buffer, index).end()
+
+        if index == len(buffer):
+            if eof:
+                raise json.JSONDecodeError(
+                    "Unexpected end of data", buffer, index
+                )
+            read(chunk_size)
+            continue
+
+        char = buffer[index]
+
+        if expecting == "[":
+            if char != "[":
+                raise json.JSONDecodeError("Expecting '['", buffer, index)
+            index += 1
+            expecting = "first"
+
+        elif expecting == "first" and char == "]":
+            return
+
+        elif expecting in ("first", "item"):
+            try:
+                obj, end = decoder.raw_decode(buffer, index)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+
+            # The item may be incomplete (or for a number, truncated) if it
+            # reaches the end of what has been read so far. Read more, growing
+            # the reads for items larger than the chunk size.
+            if end is None or (end == len(buffer) and not eof):
+                read(max(chunk_size, len(buffer) - index))
+                continue
+
+            yield obj
+            index = end
+            expecting = ","
+
+        elif char == "]":
+            return
+
+        elif char == ",":
+            index += 1
+            expecting = "item"
+
+        else:
+            raise json.JSONDecodeError("Expecting ','", buffer, index)
+
+
+def iter_exported_objects(data_file):
+    """
+    Iterate the serialized objects in an exported data file, reading them
+    incrementally rather than loading the whole file.
+    """
+    export_format = get_export_format(data_file)
+
+    with open_file(data_file) as f:
+        try:
+            if export_format == "jsonl":
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                yield from iter_json_array(f)
+        except json.JSONDecodeError as e:
+            print("Invalid file {}".format(data_file))
+            raise e
+
+
+def write_exported_objects(f, objects, export_format, indent=None):
+    """
+    Write serialized objects to a file in the given export format.
+    """
+    if export_format == "jsonl":
+        for obj in objects:
+            f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+        return
+
+    separators = (",", ": ") if indent else None
+    f.write("[")
+    for index, obj in enumerate(objects):
+        if index:
+            f.write(",")
+        f.write("\n" if indent else " " if index else "")
+        f.write(
+            json.dumps(
+                obj,
+                indent=indent,
+                separators=separators,
+                ensure_ascii=False,
+            )
+        )
+    f.write("\n]\n" if indent else "]")
+
+
+def temporary_file(data_file, prefix):
+    """
+    Get a path to write a file to before it replaces the given data file. It's
+    in a subdirectory so that it's never picked up as one of the data files.
+    """
+    path = data_file.parent / ".tmp" / "{}-{}".format(prefix, data_file.name)
+    path.parent.mkdir(exist_ok=True)
+    return path
+
+
+PkIndex = Union["array.array[int]", List[str]]
+
+
+class PkIndexBuilder:
+    """
+    Collects primary keys compactly, as a typed array while they're all 64 bit
+    integers, otherwise as a list of strings.
+    """
+
+    def __init__(self) -> None:
+        self.pks = array.array("q")  # type: PkIndex
+
+    def add(self, pk) -> None:
+        if isinstance(self.pks, array.array):
+            if (
+                isinstance(pk, int)
+                and not isinstance(pk, bool)
+                and -(2**63) <= pk < 2**63
+            ):
+                self.pks.append(pk)
+                return
+
+            self.pks = [str(x) for x in self.pks]
+
+        self.pks.append(str(pk))
+
+    def extend(self, pks: Iterable) -> None:
+        if isinstance(pks, array.array) and isinstance(self.pks, array.array):
+            self.pks.extend(pks)
+            return
+
+        for pk in pks:
+            self.add(pk)
+
+    def track(self, objects: Iterable[Model]) -> Iterator[Model]:
+        """Add the primary keys of model instances as they're iterated."""
+        for obj in objects:
+            self.add(obj.pk)
+            yield obj
+
+    def track_exported(self, objects: Iterable[dict]) -> Iterator[dict]:
+        """Add the primary keys of serialized objects as they're iterated."""
+        for obj in objects:
+            self.add(obj["pk"])
+            yield obj
+
+
+def sidecar_file(data_file, suffix):
+    """
+    Get the path of a file written alongside a data file, named after the data
+    file without its format and compression suffixes.
+    """
+    name = with_compression(data_file, None).name
+    for format_suffix in EXPORT_FORMATS.values():
+        if name.endswith(format_suffix):
+            name = name[: -len(format_suffix)]
+            break
+    return data_file.with_name(name + suffix)
+
+
+def shard_file(data_file, index):
+    """
+    Get the path of a numbered shard of a data file.
+    """
+    stem = sidecar_file(data_file, "").name
+    return data_file.with_name(
+        data_file.name.replace(stem, "{}.{:05d}".format(stem, index), 1),
+    )
+
+
+def get_shard_files(data_dir, name):
+    """
+    Get the shards of a data file with the given name, in order.
+    """
+    shard_stem = re.compile(r"{}\.\d{{5}}".format(re.escape(name)))
+    return sorted(
+        (
+            data_file
+            for data_file in get_data_files(data_dir)
+            if shard_stem.fullmatch(sidecar_file(data_file, "").name)
+        ),
+        key=lambda x: x.name,
+    )
+
+
+def get_data_file_state(data_file) -> Dict[str, int]:
+    """
+    Describe the current version of a data file, so that files written
+    alongside it can be ignored if it changes without them being rewritten.
+    """
+    stat = data_file.stat()
+    return {"data_size": stat.st_size, "data_mtime_ns": stat.st_mtime_ns}
+
+
+def is_current_data_file_state(data_file, state) -> bool:
+    current_state = get_data_file_state(data_file)
+    return all(state.get(key) == value for key, value in current_state.items())
+
+
+# The number of bytes before a point in a data file which are hashed to check
+# that the file is unchanged up to that point.
+DATA_DIGEST_SIZE = 64 * 1024
+
+
+def get_data_digest(data_file, size: int) -> str:
+    """
+    Hash the end of the first `size` bytes of a data file.
+    """
+    with data_file.open("rb") as f:
+        f.seek(max(size - DATA_DIGEST_SIZE, 0))
+        return hashlib.sha256(f.read(min(size, DATA_DIGEST_SIZE))).hexdigest()
+
+
+def pk_index_file(data_file):
+    """
+    Get the path of the primary key index written alongside a data file.
+    """
+    return sidecar_file(data_file, ".pks")
+
+
+def write_pk_index(data_file, pks: PkIndex) -> None:
+    """
+    Write the primary keys of the objects in an exported data file to an index
+    file alongside it. The index records the size and modification time of the
+    data file so that it can be ignored if the data file changes without the
+    index being rewritten.
+
+    Integer primary keys are stored as a little-endian array of 64 bit values,
+    others as one JSON encoded string per line.
+    """
+    header = get_data_file_state(data_file)
+
+    if isinstance(pks, array.array):
+        header["type"] = pks.typecode
+        if sys.byteorder != "little":
+            pks = array.array(pks.typecode, pks)
+            pks.byteswap()
+        payload = pks.tobytes()
+    else:
+        header["type"] = "str"
+        payload = "".join(json.dumps(x) + "\n" for x in pks).encode("utf-8")
+
+    with pk_index_file(data_file).open("wb") as f:
+        f.write(json.dumps(header).encode("utf-8") + b"\n")
+        f.write(payload)
+
+
+def read_pk_index(data_file) -> Optional[PkIndex]:
+    """
+    Read the primary key index for an exported data file, if there is an up to
+    date one.
+    """
+    index_file = pk_index_file(data_file)
+    if not index_file.exists():
+        return None
+
+    with index_file.open("rb") as f:
+        header = json.loads(f.readline())
+        payload = f.read()
+
+    if not is_current_data_file_state(data_file, header):
+        return None
+
+    if header["type"] == "str":
+        return [json.loads(x) for x in payload.splitlines()]
+
+    pks = array.array(header["type"])
+    pks.frombytes(payload)
+    if sys.byteorder != "little":
+        pks.byteswap()
+    return pks
+
+
+def watermark_file(data_file):
+    return sidecar_file(data_file, ".watermark")
+
+
+def write_watermark(data_file, watermark) -> None:
+    """
+    Record the watermark an exported data file is up to date with. Like the
+    primary key index, it's ignored if the data file changes without the
+    watermark being rewritten.
+    """
+    with watermark_file(data_file).open("w") as f:
+        json.dump(
+            {**get_data_file_state(data_file), "watermark": watermark},
+            f,
+            default=str,
+        )
+
+
+def read_watermark(data_file):
+    """
+    Read the watermark an exported data file is up to date with, if there is
+    an up to date one, in its JSON encoded form.
+    """
+    path = watermark_file(data_file)
+    if not path.exists() or not data_file.exists():
+        return None
+
+    with path.open() as f:
+        data = json.load(f)
+
+    if not is_current_data_file_state(data_file, data):
+        return None
+
+    return data["watermark"]
+
+
+def export_progress_file(data_file):
+    return sidecar_file(data_file, ".progress")
+
+
+def write_export_progress(data_file, last_pk) -> None:
+    """
+    Record that a data file is complete up to the given primary key, as of
+    its current size. Rows may be appended after this, so rather than its
+    modification time the progress records a digest of the data up to then.
+    """
+    data_size = data_file.stat().st_size
+    with export_progress_file(data_file).open("w") as f:
+        json.dump(
+            {
+                "data_size": data_size,
+                "data_digest": get_data_digest(data_file, data_size),
+                "pk": last_pk,
+            },
+            f,
+            default=str,
+        )
+
+
+def read_export_progress(data_file):
+    """
+    Read the progress of an incomplete export of a data file, if there is one
+    to continue from.
+    """
+    path = export_progress_file(data_file)
+    if not path.exists() or not data_file.exists():
+        return None
+
+    with path.open() as f:
+        progress = json.load(f)
+
+    data_size = progress["data_size"]
+    if data_size > data_file.stat().st_size:
+        return None
+
+    if progress.get("data_digest") != get_data_digest(data_file, data_size):
+        return None
+
+    return progress
+
+
+def delete_export_progress(data_file) -> None:
+    path = export_progress_file(data_file)
+    if path.exists():
+        path.unlink()
+
+
+@functools.lru_cache(maxsize=32)
+def get_exported_pk_index(dest, model) -> PkIndex:
+    """
+    Get the primary keys exported for a model, from the index files written
+    alongside the data where possible rather than parsing the data itself.
+    """
+    builder = PkIndexBuilder()
+
+    for data_file in get_data_files(dest / to_app_model_label(model)):
+        pks = read_pk_index(data_file)
+        if pks is None:
+            pks = (x["pk"] for x in iter_exported_objects(data_file))
+        builder.extend(pks)
+
+    return builder.pks
+
+
 @functools.lru_cache(maxsize=32)
 def get_exported_pks_for_model(dest, model):
-    return [str(x["pk"]) for x in get_exported_objects_for_model(dest, model)]
+    return [str(x) for x in get_exported_pk_index(dest, model)]
 
 
 @functools.lru_cache(maxsize=8)
@@ -123,23 +819,19 @@ def get_exported_objects_for_model(dest, model):
     app_model_label = to_app_model_label(model)
     objects = []
 
-    data_dir = dest / app_model_label
-    data_files = data_dir.glob("*.json")
-
-    for data_file in data_files:
-        with data_file.open() as f:
-            try:
-                data = json.load(f)
-            except json.JSONDecodeError as e:
-                print("Invalid file {}".format(data_file))
-                raise e
-
-            objects.extend(data)
+    for data_file in get_data_files(dest / app_model_label):
+        objects.extend(iter_exported_objects(data_file))
 
     return objects
 
 
-T = TypeVar("T")
+def batched(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
 
 
 def is_empty_iterator(iterator: Iterator[T]) -> Tuple[Iterator[T], bool]:
@@ -175,3 +867,26 @@ def nodb_cursor(connection):
         return connection._nodb_connection.cursor()
     else:
         return connection._nodb_cursor()
+
+
+def flush_tables(connection, table_names) -> None:
+    """
+    Empty the given tables and reset their sequences, in as few statements as
+    the database supports, e.g: a single `TRUNCATE` on Postgres.
+    """
+    if django.VERSION < (3, 1):
+        sql_list = connection.ops.sql_flush(
+            no_style(),
+            table_names,
+            connection.introspection.sequence_list(),
+            allow_cascade=True,
+        )
+        connection.ops.execute_sql_flush(connection.alias, sql_list)
+    else:
+        sql_list = connection.ops.sql_flush(
+            no_style(),
+            table_names,
+            reset_sequences=True,
+            allow_cascade=True,
+        )
+        connection.ops.execute_sql_flush(sql_list)
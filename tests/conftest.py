@@ -64,6 +64,14 @@ def ensure_migrations_table():
                 editor.delete_model(MigrationRecorder.Migration)
 
 
+@pytest.fixture(autouse=True)
+def schema_cache_dir(tmp_path_factory, monkeypatch):
+    # Imports run as subprocesses read the location from the environment.
+    path = tmp_path_factory.mktemp("schema-cache")
+    monkeypatch.setenv("DEVDATA_SCHEMA_CACHE_DIR", str(path))
+    return path
+
+
 @pytest.fixture(autouse=True)
 def cleanup_test_data(test_data_dir):
     yield
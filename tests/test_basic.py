@@ -11,6 +11,7 @@ from test_infrastructure import DevdataTestBase
 from test_infrastructure.utils import assert_ran_successfully, run_command
 
 from devdata.reset_modes import MODES
+from devdata.utils import nodb_cursor
 
 
 class TestPollsBasic(DevdataTestBase):
@@ -231,3 +232,152 @@ class TestPollsBasic(DevdataTestBase):
             ("exported_only", "0001_initial"),
             ("fake-app", "0001-fake-migration"),
         ]
+
+    def test_import_snapshot(
+        self,
+        test_data_dir,
+        default_export_data,
+        django_db_blocker,
+        ensure_migrations_table,
+    ):
+        self.dump_data_for_import(self.get_original_data(), test_data_dir)
+        reset_mode = MODES["template-database"]
+
+        def run_import():
+            for connection in connections.all():
+                connection.close()
+
+            process = run_command(
+                "devdata_import",
+                test_data_dir.name,
+                "--no-input",
+                "--reset-mode=template-database",
+                "--snapshot",
+            )
+            assert_ran_successfully(process)
+            return process.stdout.decode("utf-8")
+
+        try:
+            assert "Restored" not in run_import()
+
+            with django_db_blocker.unblock():
+                self.assert_on_imported_data()
+                Question.objects.create(
+                    question_text="Do you like jam?",
+                    pub_date=datetime.datetime.now(datetime.timezone.utc),
+                )
+
+            # The snapshot doesn't include changes made after the import.
+            assert "Restored database from snapshot" in run_import()
+            with django_db_blocker.unblock():
+                self.assert_on_imported_data()
+
+            # Changing the export invalidates the snapshot.
+            (test_data_dir / "polls.Choice" / "default.json").write_text("[]")
+            assert "Restored" not in run_import()
+            with django_db_blocker.unblock():
+                assert Choice.objects.count() == 0
+        finally:
+            connection = connections["default"]
+            connection.close()
+            with nodb_cursor(connection) as cursor:
+                cursor.execute(
+                    "DROP DATABASE IF EXISTS {}".format(
+                        reset_mode.get_template_name("default"),
+                    ),
+                )
+
+    def test_snapshot_requires_template_database_reset_mode(
+        self,
+        test_data_dir,
+    ):
+        process = run_command(
+            "devdata_import",
+            test_data_dir.name,
+            "--no-input",
+            "--snapshot",
+        )
+        assert process.returncode != 0
+        assert b"--snapshot requires" in process.stderr
+
+    def test_import_reuses_cached_schema(
+        self,
+        test_data_dir,
+        default_export_data,
+        django_db_blocker,
+        ensure_migrations_table,
+        schema_cache_dir,
+    ):
+        self.dump_data_for_import(self.get_original_data(), test_data_dir)
+
+        for _ in range(2):
+            for connection in connections.all():
+                connection.close()
+
+            process = run_command(
+                "devdata_import",
+                test_data_dir.name,
+                "--no-input",
+            )
+            assert_ran_successfully(process)
+
+            with django_db_blocker.unblock():
+                self.assert_on_imported_data()
+
+        # Both imports used the same cached schema, which isn't stored in the
+        # import source.
+        assert len(list(schema_cache_dir.iterdir())) == 1
+        assert not list(test_data_dir.glob(".*"))
+
+    def test_import_keeps_schema_for_truncate_reset(
+        self,
+        test_data_dir,
+        default_export_data,
+        django_db_blocker,
+        ensure_migrations_table,
+    ):
+        self.dump_data_for_import(self.get_original_data(), test_data_dir)
+
+        for _ in range(2):
+            for connection in connections.all():
+                connection.close()
+
+            process = run_command(
+                "devdata_import",
+                test_data_dir.name,
+                "--no-input",
+                "--reset-mode=truncate",
+            )
+            assert_ran_successfully(process)
+
+        # The imported schema is recorded, so the truncate reset can keep it.
+        with django_db_blocker.unblock():
+            self.assert_on_imported_data()
+            assert MODES["truncate"].schema_matches("default", test_data_dir)
+
+    def test_import_with_unwritable_schema_cache(
+        self,
+        test_data_dir,
+        default_export_data,
+        django_db_blocker,
+        ensure_migrations_table,
+        monkeypatch,
+        tmp_path,
+    ):
+        self.dump_data_for_import(self.get_original_data(), test_data_dir)
+        (tmp_path / "file").write_text("")
+        monkeypatch.setenv(
+            "DEVDATA_SCHEMA_CACHE_DIR",
+            str(tmp_path / "file" / "cache"),
+        )
+
+        for connection in connections.all():
+            connection.close()
+
+        process = run_command(
+            "devdata_import", test_data_dir.name, "--no-input"
+        )
+        assert_ran_successfully(process)
+
+        with django_db_blocker.unblock():
+            self.assert_on_imported_data()
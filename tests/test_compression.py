@@ -0,0 +1,98 @@
+import datetime
+import gzip
+import json
+
+import pytest
+from django.test import override_settings
+from polls.models import Choice, Question
+
+from devdata.engine import export_migration_state
+from devdata.extras import PostgresSequences
+from devdata.strategies import QuerySetStrategy
+from devdata.utils import (
+    find_file,
+    get_exported_pks_for_model,
+    migrations_file_path,
+    open_file,
+    read_pk_index,
+)
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+@pytest.mark.parametrize("data_format", ["json", "jsonl"])
+@pytest.mark.django_db(transaction=True)
+def test_compressed_export_and_import(
+    compression,
+    data_format,
+    tmp_path,
+    ensure_migrations_table,
+):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+
+    question = Question.objects.create(
+        pk=1,
+        question_text="Compressed?",
+        pub_date=datetime.datetime.now(datetime.timezone.utc),
+    )
+    Choice.objects.create(pk=2, question=question, choice_text="Yes")
+
+    strategy = QuerySetStrategy(
+        name="compressed-{}-{}".format(compression, data_format),
+        data_format=data_format,
+    )
+
+    with override_settings(DEVDATA_EXPORT_COMPRESSION=compression):
+        export_migration_state("default", tmp_path)
+        strategy.export_data("default", tmp_path, Question)
+
+        data_file = strategy.data_file(tmp_path, "polls.Question")
+
+    assert data_file.name.endswith(
+        {"gzip": ".gz", "zstd": ".zst"}[compression],
+    )
+    assert not data_file.with_suffix("").exists()
+    assert list(read_pk_index(data_file)) == [1]
+    assert get_exported_pks_for_model(tmp_path, Question) == ["1"]
+
+    migrations_file = find_file(migrations_file_path(tmp_path))
+    assert migrations_file != migrations_file_path(tmp_path)
+    with open_file(migrations_file) as f:
+        assert json.load(f) == []
+
+    Choice.objects.all().delete()
+    Question.objects.all().delete()
+
+    # Imports detect the compression regardless of the current setting.
+    strategy.import_data("default", tmp_path, Question)
+    assert Question.objects.get().question_text == "Compressed?"
+
+
+def test_open_file_gzip(tmp_path):
+    path = tmp_path / "data.json.gz"
+
+    with open_file(path, "w") as f:
+        f.write("[]")
+
+    assert gzip.decompress(path.read_bytes()) == b"[]"
+
+
+@pytest.mark.django_db
+def test_enabling_compression_removes_stale_files(
+    tmp_path,
+    ensure_migrations_table,
+):
+    export_migration_state("default", tmp_path)
+    PostgresSequences().export_data("default", tmp_path)
+
+    with override_settings(DEVDATA_EXPORT_COMPRESSION="gzip"):
+        export_migration_state("default", tmp_path)
+        PostgresSequences().export_data("default", tmp_path)
+
+    assert find_file(migrations_file_path(tmp_path)).name == (
+        "migrations.json.gz"
+    )
+    assert sorted(x.name for x in tmp_path.iterdir()) == [
+        "migrations.json.gz",
+        "postgres-sequences.json.gz",
+    ]
@@ -0,0 +1,95 @@
+import datetime
+
+import pytest
+from django.db import IntegrityError, connection
+from polls.models import Choice, Question
+
+from devdata.deferred_constraints import FOREIGN_KEY, INDEX, DeferredConstraints
+
+
+def get_constraints(table_name):
+    with connection.cursor() as cursor:
+        return connection.introspection.get_constraints(cursor, table_name)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_defer_and_restore():
+    tables = [Question._meta.db_table, Choice._meta.db_table]
+    original = get_constraints(Choice._meta.db_table)
+    assert any(x["foreign_key"] for x in original.values())
+
+    deferred = DeferredConstraints("default")
+    deferred.defer(tables)
+
+    constraints = get_constraints(Choice._meta.db_table)
+    assert not any(x["foreign_key"] for x in constraints.values())
+    assert [x["primary_key"] for x in constraints.values()] == [True]
+
+    question = Question.objects.create(
+        question_text="Do you like jam?",
+        pub_date=datetime.datetime.now(datetime.timezone.utc),
+    )
+    Choice.objects.create(question=question, choice_text="Yes", votes=2)
+
+    deferred.restore()
+
+    assert not deferred.exists()
+    assert get_constraints(Choice._meta.db_table) == original
+
+
+@pytest.mark.django_db(transaction=True)
+def test_restore_validates_foreign_keys():
+    deferred = DeferredConstraints("default")
+    deferred.defer([Choice._meta.db_table])
+
+    Choice.objects.create(question_id=404, choice_text="Yes", votes=2)
+
+    with pytest.raises(IntegrityError):
+        deferred.restore()
+
+    # The constraint which couldn't be validated is left to be restored
+    # once the data is fixed.
+    Choice.objects.all().delete()
+    deferred.restore()
+    assert not deferred.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_defer_restores_leftover_record():
+    original = get_constraints(Choice._meta.db_table)
+    deferred = DeferredConstraints("default")
+    deferred.defer([Choice._meta.db_table])
+
+    # An import which was interrupted before restoring is followed by another.
+    deferred.defer([Question._meta.db_table])
+
+    assert get_constraints(Choice._meta.db_table) == original
+    assert deferred.get_deferred(FOREIGN_KEY) == []
+
+    deferred.restore()
+    assert not deferred.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_restore_rebuilds_invalid_index():
+    original = get_constraints(Choice._meta.db_table)
+    deferred = DeferredConstraints("default")
+    deferred.defer([Choice._meta.db_table])
+
+    # Simulate a concurrent build which was interrupted, leaving an invalid
+    # index behind.
+    ((name, _, definition),) = deferred.get_deferred(INDEX)
+    with connection.cursor() as cursor:
+        cursor.execute(definition)
+        cursor.execute(
+            "UPDATE pg_index SET indisvalid = false "
+            "WHERE indexrelid = %s::regclass",
+            [name],
+        )
+        assert deferred.is_index_valid(cursor, name) is False
+
+    deferred.restore()
+
+    with connection.cursor() as cursor:
+        assert deferred.is_index_valid(cursor, name) is True
+    assert get_constraints(Choice._meta.db_table) == original
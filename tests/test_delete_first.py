@@ -0,0 +1,57 @@
+import datetime
+from unittest import mock
+
+import pytest
+from django.db.models import QuerySet
+from polls.models import Choice, Question
+
+from devdata.strategies import DeleteFirstQuerySetStrategy
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("fast_delete", [False, True])
+def test_delete_first(fast_delete):
+    question = Question.objects.create(
+        question_text="Do you like jam?",
+        pub_date=datetime.datetime.now(datetime.timezone.utc),
+    )
+    Choice.objects.create(question=question, choice_text="Yes", votes=2)
+
+    strategy = DeleteFirstQuerySetStrategy(
+        name="replaced",
+        fast_delete=fast_delete,
+    )
+    with mock.patch.object(
+        QuerySet,
+        "delete",
+        autospec=True,
+        side_effect=QuerySet.delete,
+    ) as delete:
+        strategy.import_objects("default", None, Question, [])
+
+    # The fast delete doesn't collect related objects, leaving the cascade to
+    # the database.
+    assert delete.called is not fast_delete
+    assert not Question.objects.exists()
+    assert not Choice.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_fast_delete_without_postgres():
+    question = Question.objects.create(
+        question_text="Do you like jam?",
+        pub_date=datetime.datetime.now(datetime.timezone.utc),
+    )
+    Choice.objects.create(question=question, choice_text="Yes", votes=2)
+
+    strategy = DeleteFirstQuerySetStrategy(name="replaced", fast_delete=True)
+    with mock.patch(
+        "devdata.strategies.is_postgres",
+        return_value=False,
+    ), mock.patch.object(QuerySet, "delete") as delete:
+        strategy.import_objects("default", None, Question, [])
+
+    # Without a database cascade the referencing rows are deleted first.
+    assert not delete.called
+    assert not Question.objects.exists()
+    assert not Choice.objects.exists()
@@ -0,0 +1,113 @@
+import array
+import io
+import json
+import os
+
+import pytest
+from photofeed.models import Photo
+from test_infrastructure import make_photo_data
+
+from devdata.utils import (
+    PkIndexBuilder,
+    get_data_files,
+    get_exported_pk_index,
+    get_exported_pks_for_model,
+    iter_exported_objects,
+    iter_json_array,
+    pk_index_file,
+    read_pk_index,
+    write_pk_index,
+)
+
+
+def test_reads_json_and_jsonl_exports(tmp_path):
+    data_dir = tmp_path / "photofeed.Photo"
+    data_dir.mkdir()
+
+    (data_dir / "first.json").write_text(
+        json.dumps([make_photo_data(1, None), make_photo_data(2, None)]),
+    )
+    (data_dir / "second.jsonl").write_text(
+        "\n".join(json.dumps(make_photo_data(pk, None)) for pk in (3, 4, 5)),
+    )
+
+    assert [x.name for x in get_data_files(data_dir)] == [
+        "first.json",
+        "second.jsonl",
+    ]
+    jsonl_objects = iter_exported_objects(data_dir / "second.jsonl")
+    assert [x["pk"] for x in jsonl_objects] == [3, 4, 5]
+
+    pks = get_exported_pks_for_model(tmp_path, Photo)
+    assert pks == ["1", "2", "3", "4", "5"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 4096])
+def test_iter_json_array_decodes_across_chunks(chunk_size):
+    data = [
+        make_photo_data(1, None, title="A [tricky], {title}"),
+        12345,
+        "text",
+        [],
+        {"nested": [1.5, None, True]},
+    ]
+    text = json.dumps(data, indent=2)
+
+    assert list(iter_json_array(io.StringIO(text), chunk_size)) == data
+
+
+@pytest.mark.parametrize("text", ["", "[", "[1,", "[1 2]", "{}"])
+def test_iter_json_array_rejects_invalid_data(text):
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(io.StringIO(text), chunk_size=2))
+
+
+def test_iter_json_array_empty():
+    assert list(iter_json_array(io.StringIO(" [ ] "))) == []
+
+
+@pytest.mark.parametrize(
+    "pks, expected",
+    [
+        (
+            [1, 2, -(2**63), 2**63 - 1],
+            array.array("q", [1, 2, -(2**63), 2**63 - 1]),
+        ),
+        ([1, "a\nb", "ü"], ["1", "a\nb", "ü"]),
+        ([1, 2**63], ["1", str(2**63)]),
+    ],
+)
+def test_pk_index_round_trip(tmp_path, pks, expected):
+    data_file = tmp_path / "default.json"
+    data_file.write_text("[]")
+
+    builder = PkIndexBuilder()
+    builder.extend(pks)
+    write_pk_index(data_file, builder.pks)
+
+    assert pk_index_file(data_file) == tmp_path / "default.pks"
+    assert read_pk_index(data_file) == expected
+
+    # Indexes are ignored once the data file changes, even if its size doesn't
+    data_file.write_text("{}")
+    os.utime(data_file, ns=(0, 0))
+    assert read_pk_index(data_file) is None
+
+    data_file.write_text("[ ]")
+    assert read_pk_index(data_file) is None
+
+
+def test_exported_pks_read_from_index(tmp_path):
+    data_dir = tmp_path / "photofeed.Photo"
+    data_dir.mkdir()
+
+    indexed = data_dir / "indexed.jsonl"
+    indexed.write_text(json.dumps(make_photo_data(1, None)))
+    # Deliberately differs from the data to show that it's used
+    write_pk_index(indexed, array.array("q", [7, 8]))
+
+    (data_dir / "unindexed.json").write_text(
+        json.dumps([make_photo_data(3, None)]),
+    )
+
+    assert get_exported_pk_index(tmp_path, Photo) == array.array("q", [7, 8, 3])
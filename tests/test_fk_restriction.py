@@ -1,6 +1,14 @@
+import json
+
+import pytest
 from django.contrib.auth.models import User
+from django.db import connection
+from photofeed.models import Photo
 from test_infrastructure import DevdataTestBase, make_photo_data, make_user_data
 
+from devdata.strategies import QuerySetStrategy
+from devdata.utils import get_exported_pk_index
+
 
 class TestFKRestriction(DevdataTestBase):
     def get_original_data(self):
@@ -31,3 +39,55 @@ class TestFKRestriction(DevdataTestBase):
         assert set(
             User.objects.get(pk=101).photo_set.values_list("pk", flat=True)
         ) == set((201, 202))
+
+
+class TestFKRestrictionConcurrent(TestFKRestriction):
+    export_args = ("--workers=4",)
+    import_args = ("--workers=4",)
+
+
+@pytest.mark.django_db
+def test_restriction_query_size_is_constant(tmp_path):
+    (tmp_path / "auth.User").mkdir()
+
+    def get_query(pks):
+        (tmp_path / "auth.User" / "all.json").write_text(
+            json.dumps([make_user_data(pk, None) for pk in pks]),
+        )
+        get_exported_pk_index.cache_clear()
+
+        strategy = QuerySetStrategy(name="default")
+        queryset = strategy.get_queryset("default", tmp_path, Photo)
+        return queryset.query.sql_with_params()
+
+    small_sql, small_params = get_query(range(1, 3))
+    large_sql, large_params = get_query(range(1, 5000))
+
+    assert small_sql == large_sql
+    assert len(small_params) == len(large_params) == 1
+
+    User.objects.create(pk=2, username="included")
+    User.objects.create(pk=6000, username="excluded")
+    for pk in (2, 6000):
+        Photo.objects.create(
+            pk=pk, user_id=pk, lat=1, lng=1, image_url="https://", title="T"
+        )
+
+    strategy = QuerySetStrategy(name="default")
+    queryset = strategy.get_queryset("default", tmp_path, Photo)
+    assert list(queryset.values_list("pk", flat=True)) == [2]
+
+
+class TestFKRestrictionDeferredIndexes(TestFKRestriction):
+    import_args = ("--defer-indexes",)
+
+    def assert_on_imported_data(self):
+        super().assert_on_imported_data()
+
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor,
+                Photo._meta.db_table,
+            )
+        assert any(x["foreign_key"] for x in constraints.values())
+        assert any(x["index"] and not x["unique"] for x in constraints.values())
@@ -0,0 +1,123 @@
+import datetime
+
+import pytest
+from polls.models import Choice, Question
+
+from devdata.strategies import QuerySetStrategy
+from devdata.utils import (
+    get_exported_pk_index,
+    iter_exported_objects,
+    read_pk_index,
+    read_watermark,
+)
+
+
+def date(day):
+    return datetime.datetime(2021, 1, day, tzinfo=datetime.timezone.utc)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("data_format", ["json", "jsonl"])
+def test_incremental_export(tmp_path, data_format):
+    strategy = QuerySetStrategy(
+        name="incremental-{}".format(data_format),
+        anonymise=False,
+        data_format=data_format,
+        watermark="pub_date",
+    )
+    data_file = strategy.data_file(tmp_path, "polls.Question")
+
+    def export():
+        # Strategy names are only expected to be exported once per process.
+        strategy.seen_names.discard(("polls.Question", strategy.name))
+        strategy.export_data("default", tmp_path, Question)
+        return {
+            x["pk"]: x["fields"]["question_text"]
+            for x in iter_exported_objects(data_file)
+        }
+
+    first = Question.objects.create(pk=1, question_text="1", pub_date=date(1))
+    Question.objects.create(pk=2, question_text="2", pub_date=date(2))
+
+    assert export() == {1: "1", 2: "2"}
+    assert read_watermark(data_file) == "2021-01-02 00:00:00+00:00"
+
+    # Rows past the watermark are merged into the existing export, replacing
+    # those with the same primary key.
+    Question.objects.filter(pk=2).update(question_text="Not exported")
+    first.question_text = "1 (updated)"
+    first.pub_date = date(3)
+    first.save()
+    Question.objects.create(pk=3, question_text="3", pub_date=date(4))
+
+    assert export() == {1: "1 (updated)", 2: "2", 3: "3"}
+    assert sorted(read_pk_index(data_file)) == [1, 2, 3]
+    assert read_watermark(data_file) == "2021-01-04 00:00:00+00:00"
+    assert not (data_file.parent / ".tmp").exists()
+
+    # Without a valid watermark everything is exported again.
+    data_file.write_text(data_file.read_text() + "\n")
+    assert export() == {1: "1 (updated)", 2: "Not exported", 3: "3"}
+
+
+@pytest.mark.django_db
+def test_incremental_export_reapplies_restrictions(tmp_path):
+    class QuestionStrategy(QuerySetStrategy):
+        question_pks = [1, 2]
+
+        def get_queryset(self, django_dbname, dest, model):
+            return (
+                super()
+                .get_queryset(django_dbname, dest, model)
+                .filter(
+                    pk__in=self.question_pks,
+                )
+            )
+
+    question_strategy = QuestionStrategy(name="restricting")
+    choice_strategy = QuerySetStrategy(name="restricted", watermark="id")
+    data_file = choice_strategy.data_file(tmp_path, "polls.Choice")
+
+    def export():
+        get_exported_pk_index.cache_clear()
+        for strategy, model in (
+            (question_strategy, Question),
+            (choice_strategy, Choice),
+        ):
+            # Strategy names are only expected to be exported once per
+            # process.
+            strategy.seen_names.discard(
+                (model._meta.label, strategy.name),
+            )
+            strategy.export_data("default", tmp_path, model)
+        get_exported_pk_index.cache_clear()
+        return sorted(x["pk"] for x in iter_exported_objects(data_file))
+
+    for pk in (1, 2):
+        question = Question.objects.create(
+            pk=pk,
+            question_text=str(pk),
+            pub_date=date(pk),
+        )
+        Choice.objects.create(pk=pk, question=question, choice_text=str(pk))
+
+    assert export() == [1, 2]
+
+    # Rows kept from the previous export are dropped once the rows they
+    # refer to are no longer exported.
+    QuestionStrategy.question_pks = [1]
+    Choice.objects.create(pk=3, question_id=1, choice_text="3")
+
+    assert export() == [1, 3]
+    assert sorted(read_pk_index(data_file)) == [1, 3]
+
+
+def test_incremental_export_of_sliced_queryset(tmp_path):
+    class SampleStrategy(QuerySetStrategy):
+        def get_queryset(self, django_dbname, dest, model):
+            return super().get_queryset(django_dbname, dest, model)[:10]
+
+    strategy = SampleStrategy(name="sliced", watermark="pk")
+
+    with pytest.raises(ValueError):
+        strategy.export_data("default", tmp_path, Question)
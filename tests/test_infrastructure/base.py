@@ -21,6 +21,10 @@ TestObject = Dict[str, Any]
 class DevdataTestBase:
     # Public API for tests
 
+    # Extra arguments for the export & import commands
+    export_args: tuple[str, ...] = ()
+    import_args: tuple[str, ...] = ()
+
     def get_original_data(self):
         raise NotImplementedError
 
@@ -121,6 +125,7 @@ class DevdataTestBase:
         process = run_command(
             "devdata_export",
             test_data_dir.name,
+            *self.export_args,
         )
         assert_ran_successfully(process)
 
@@ -134,10 +139,14 @@ class DevdataTestBase:
                 exported_data[child.name] = {}
                 if child.is_dir():
                     for strategy_file in child.iterdir():
+                        if strategy_file.suffix not in (".json", ".jsonl"):
+                            continue
                         with strategy_file.open() as f:
-                            exported_data[child.name][
-                                strategy_file.stem
-                            ] = json.load(f)
+                            if strategy_file.suffix == ".jsonl":
+                                data = [json.loads(x) for x in f]
+                            else:
+                                data = json.load(f)
+                        exported_data[child.name][strategy_file.stem] = data
 
         self.assert_on_exported_data(exported_data)
 
@@ -163,6 +172,7 @@ class DevdataTestBase:
             test_data_dir.name,
             "--no-input",
             f"--reset-mode={reset_mode}",
+            *self.import_args,
         )
         assert_ran_successfully(process)
 
@@ -0,0 +1,156 @@
+import array
+import io
+import os
+from unittest import mock
+
+from test_infrastructure import run_command
+
+from devdata.manifest import (
+    build_manifest,
+    get_changed_chunks,
+    get_content_fingerprint,
+    get_export_fingerprint,
+    get_manifest_files,
+    hash_file,
+    iter_chunks,
+    manifest_file_path,
+    read_manifest,
+    verify_export,
+    write_manifest,
+)
+from devdata.utils import write_pk_index
+
+
+def write_export(dest):
+    data_file = dest / "polls.Question" / "default.jsonl"
+    data_file.parent.mkdir(parents=True)
+    data_file.write_text('{"pk": 1}\n{"pk": 2}\n')
+    write_pk_index(data_file, array.array("q", [1, 2]))
+    (dest / "migrations.json").write_text("[]")
+    return data_file
+
+
+def test_manifest(tmp_path):
+    data_file = write_export(tmp_path)
+    manifest = write_manifest(tmp_path)
+
+    assert manifest == read_manifest(tmp_path)
+    assert sorted(manifest["files"]) == [
+        "migrations.json",
+        "polls.Question/default.jsonl",
+        "polls.Question/default.pks",
+    ]
+
+    description = manifest["files"]["polls.Question/default.jsonl"]
+    assert description["size"] == data_file.stat().st_size
+    assert description["rows"] == 2
+    assert description["chunks"] == [
+        [description["size"], description["sha256"]],
+    ]
+    assert manifest["files"]["migrations.json"]["rows"] is None
+
+    assert verify_export(tmp_path) == []
+
+
+def test_changed_chunks(tmp_path):
+    data_file = write_export(tmp_path)
+    rows = ['{{"pk": {}, "text": "row {}"}}\n'.format(x, x) for x in range(500)]
+    data_file.write_text("".join(rows))
+    previous = build_manifest(tmp_path, chunk_size=256)
+    chunks = previous["files"]["polls.Question/default.jsonl"]["chunks"]
+    assert len(chunks) > 20
+
+    # Chunk boundaries follow the content, so inserting a row only changes
+    # the chunk it's inserted into rather than every chunk after it.
+    rows.insert(250, '{"pk": 1000, "text": "inserted"}\n')
+    data_file.write_text("".join(rows))
+
+    current = build_manifest(tmp_path, chunk_size=256)
+    changed = get_changed_chunks(previous, current)
+    assert list(changed) == ["polls.Question/default.jsonl"]
+    assert 1 <= len(changed["polls.Question/default.jsonl"]) <= 2
+    assert get_export_fingerprint(previous) != get_export_fingerprint(current)
+
+
+def test_chunk_sizes_are_bounded(tmp_path):
+    path = tmp_path / "data"
+    path.write_bytes(b"x" * 5000 + b"\n" + b"y\n" * 2000)
+
+    with path.open("rb") as f:
+        chunks = list(iter_chunks(f, 256))
+
+    assert b"".join(chunks) == path.read_bytes()
+    assert all(len(x) <= 1024 for x in chunks)
+    assert all(len(x) >= 64 for x in chunks[:-1])
+
+
+def test_chunks_read_lines_in_bounded_pieces():
+    class BoundedReader(io.BytesIO):
+        def readline(self, size=-1):
+            assert 0 < size <= 1024
+            return super().readline(size)
+
+        def __iter__(self):
+            raise AssertionError("Lines must be read with a size limit")
+
+    data = b"x" * 10000
+    chunks = list(iter_chunks(BoundedReader(data), 256))
+
+    assert b"".join(chunks) == data
+    assert all(len(x) <= 1024 for x in chunks)
+
+
+def test_content_fingerprint_trusts_unchanged_files(tmp_path):
+    data_file = write_export(tmp_path)
+    manifest = write_manifest(tmp_path)
+
+    manifest_mtime_ns = manifest_file_path(tmp_path).stat().st_mtime_ns
+    for path in get_manifest_files(tmp_path):
+        os.utime(path, ns=(manifest_mtime_ns - 10**9,) * 2)
+
+    with mock.patch("devdata.manifest.hash_file") as mock_hash_file:
+        fingerprint = get_content_fingerprint(tmp_path)
+    assert not mock_hash_file.called
+    assert fingerprint == get_export_fingerprint(manifest)
+
+    # Files changed since the manifest was written are hashed again.
+    data_file.write_text('{"pk": 1}\n{"pk": 3}\n')
+    os.utime(data_file, ns=(manifest_mtime_ns,) * 2)
+
+    with mock.patch(
+        "devdata.manifest.hash_file",
+        wraps=hash_file,
+    ) as mock_hash_file:
+        assert get_content_fingerprint(tmp_path) != fingerprint
+    mock_hash_file.assert_called_once_with(data_file)
+
+
+def test_verify_export(tmp_path):
+    data_file = write_export(tmp_path)
+    write_manifest(tmp_path)
+
+    data_file.write_text(data_file.read_text().replace("2", "3"))
+    (tmp_path / "migrations.json").unlink()
+    (tmp_path / "polls.Question" / "other.json").write_text("[]")
+
+    assert verify_export(tmp_path) == [
+        "migrations.json: missing",
+        "polls.Question/other.json: not in manifest",
+        "polls.Question/default.jsonl: content differs in chunks 0",
+    ]
+
+
+def test_import_verify(test_data_dir):
+    write_export(test_data_dir)
+    write_manifest(test_data_dir)
+    (test_data_dir / "migrations.json").write_text("[{}]")
+
+    process = run_command(
+        "devdata_import",
+        test_data_dir.name,
+        "--no-input",
+        "--verify",
+    )
+
+    assert process.returncode != 0
+    assert b"migrations.json: expected 2 bytes, found 4" in process.stderr
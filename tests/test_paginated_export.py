@@ -0,0 +1,128 @@
+import datetime
+from unittest import mock
+
+import pytest
+from polls.models import Question
+
+from devdata.strategies import QuerySetStrategy
+from devdata.utils import (
+    export_progress_file,
+    iter_exported_objects,
+    read_export_progress,
+    read_pk_index,
+    write_export_progress,
+)
+
+
+def create_questions(count):
+    Question.objects.bulk_create(
+        Question(
+            pk=x,
+            question_text=str(x),
+            pub_date=datetime.datetime(
+                2021, 1, 1, tzinfo=datetime.timezone.utc
+            ),
+        )
+        for x in range(1, count + 1)
+    )
+
+
+def export(strategy, dest):
+    # Strategy names are only expected to be exported once per process.
+    strategy.seen_names.discard(("polls.Question", strategy.name))
+    strategy.export_data("default", dest, Question)
+    data_file = strategy.data_file(dest, "polls.Question")
+    return [x["pk"] for x in iter_exported_objects(data_file)]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "data_format, export_with_copy",
+    [("json", False), ("jsonl", False), ("jsonl", True)],
+)
+def test_paginated_export(tmp_path, data_format, export_with_copy):
+    create_questions(5)
+
+    strategy = QuerySetStrategy(
+        name="paginated-{}-{}".format(data_format, export_with_copy),
+        anonymise=False,
+        data_format=data_format,
+        export_with_copy=export_with_copy,
+        page_size=2,
+    )
+
+    with mock.patch.object(
+        strategy,
+        "iterate_pages",
+        wraps=strategy.iterate_pages,
+    ) as iterate_pages:
+        assert sorted(export(strategy, tmp_path)) == [1, 2, 3, 4, 5]
+
+    assert iterate_pages.call_count == 1
+    data_file = strategy.data_file(tmp_path, "polls.Question")
+    assert sorted(read_pk_index(data_file)) == [1, 2, 3, 4, 5]
+    assert not export_progress_file(data_file).exists()
+
+
+@pytest.mark.django_db
+def test_resume_paginated_export(tmp_path):
+    create_questions(5)
+
+    strategy = QuerySetStrategy(
+        name="paginated-resume",
+        anonymise=False,
+        data_format="jsonl",
+        page_size=2,
+    )
+    data_file = strategy.data_file(tmp_path, "polls.Question")
+    serialize = strategy.serialize
+
+    def fail_on_third_page(dest, objects, output):
+        if objects[0].pk == 5:
+            output.write("partial")
+            raise RuntimeError("Failed")
+        serialize(dest, objects, output)
+
+    with mock.patch.object(strategy, "serialize", fail_on_third_page):
+        with pytest.raises(RuntimeError):
+            export(strategy, tmp_path)
+
+    assert export_progress_file(data_file).exists()
+
+    # Rows after the last complete page are exported on the next run.
+    Question.objects.filter(pk__lte=4).update(question_text="Not exported")
+    with mock.patch.object(strategy, "serialize", wraps=serialize) as mocked:
+        assert export(strategy, tmp_path) == [1, 2, 3, 4, 5]
+
+    mocked.assert_called_once()
+    assert list(read_pk_index(data_file)) == [1, 2, 3, 4, 5]
+    assert not export_progress_file(data_file).exists()
+    assert [
+        x["fields"]["question_text"] for x in iter_exported_objects(data_file)
+    ] == ["1", "2", "3", "4", "5"]
+
+
+def test_paginated_export_of_sliced_queryset(tmp_path):
+    class SampleStrategy(QuerySetStrategy):
+        def get_queryset(self, django_dbname, dest, model):
+            return super().get_queryset(django_dbname, dest, model)[:10]
+
+    strategy = SampleStrategy(name="paginated-sliced", page_size=10)
+
+    with pytest.raises(ValueError):
+        export(strategy, tmp_path)
+
+
+def test_export_progress_ignored_when_data_changes(tmp_path):
+    data_file = tmp_path / "default.jsonl"
+    data_file.write_text('{"pk": 1}\n{"pk": 2}\n')
+    write_export_progress(data_file, 2)
+    assert read_export_progress(data_file)["pk"] == 2
+
+    # Rows appended after the progress was recorded are discarded on resume.
+    with data_file.open("a") as f:
+        f.write('{"pk": 3')
+    assert read_export_progress(data_file)["pk"] == 2
+
+    data_file.write_text('{"pk": 7}\n{"pk": 8}\n{"pk": 3')
+    assert read_export_progress(data_file) is None
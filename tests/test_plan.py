@@ -0,0 +1,48 @@
+import pytest
+from test_infrastructure import assert_ran_successfully, run_command
+
+from devdata.utils import get_dependency_levels
+
+
+def test_dependency_levels():
+    levels = get_dependency_levels(
+        {
+            "c": {"a", "b"},
+            "a": set(),
+            "d": {"c", "missing"},
+            "b": {"a", "b"},
+            "e": set(),
+        }
+    )
+    assert levels == [["a", "e"], ["b"], ["c"], ["d"]]
+
+
+def test_dependency_cycle():
+    with pytest.raises(RuntimeError) as e:
+        get_dependency_levels(
+            {
+                "a": set(),
+                "b": {"a", "d"},
+                "c": {"b"},
+                "d": {"c"},
+                "e": {"d"},
+            }
+        )
+
+    assert str(e.value) == (
+        "Can't resolve dependencies for b, c, d, e, which form a cycle: "
+        "b -> d -> c -> b"
+    )
+
+
+def test_plan_command():
+    process = run_command("devdata_plan")
+    assert_ran_successfully(process)
+
+    output = process.stdout.decode()
+    assert output.startswith("Level 0:\n")
+    assert "  polls.Question [default]\n" in output
+    assert "  polls.Choice [default]\n    depends on: polls.Question\n" in (
+        output
+    )
+    assert output.index("polls.Question") < output.index("polls.Choice")
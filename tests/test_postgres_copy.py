@@ -0,0 +1,134 @@
+import datetime
+import decimal
+import uuid
+
+import pytest
+from django.core import serializers
+from django.db import connection
+from django.forms.models import model_to_dict
+from polls.models import Choice, Question
+
+from devdata.postgres import copy_objects, supports_copy, to_copy_text
+from devdata.strategies import QuerySetStrategy
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (None, "\\N"),
+        (True, "t"),
+        (False, "f"),
+        (12, "12"),
+        (decimal.Decimal("1.50"), "1.50"),
+        ("tab\tnew\nline\\", "tab\\tnew\\nline\\\\"),
+        (b"\x01\xff", "\\\\x01ff"),
+        (datetime.date(2021, 1, 2), "2021-01-02"),
+        (
+            datetime.datetime(
+                2021, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc
+            ),
+            "2021-01-02T03:04:05+00:00",
+        ),
+        (
+            datetime.timedelta(days=1, seconds=2, microseconds=3),
+            "1 days 2 seconds 3 microseconds",
+        ),
+        (
+            uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "12345678-1234-5678-1234-567812345678",
+        ),
+    ],
+)
+def test_to_copy_text(value, expected):
+    assert to_copy_text(value) == expected
+
+
+@pytest.mark.django_db
+def test_copy_objects():
+    assert supports_copy(connection, Question)
+
+    copy_objects(
+        connection,
+        Question,
+        [
+            Question(
+                pk=1,
+                question_text="Tabs\tand\nnewlines",
+                pub_date=datetime.datetime(
+                    2021, 1, 2, tzinfo=datetime.timezone.utc
+                ),
+            ),
+        ],
+    )
+
+    question = Question.objects.get()
+    assert question.pk == 1
+    assert question.question_text == "Tabs\tand\nnewlines"
+    assert question.pub_date == datetime.datetime(
+        2021, 1, 2, tzinfo=datetime.timezone.utc
+    )
+
+
+@pytest.mark.django_db
+def test_import_objects_with_copy_skips_existing_rows():
+    question = Question.objects.create(
+        pk=1,
+        question_text="Existing",
+        pub_date=datetime.datetime.now(datetime.timezone.utc),
+    )
+    Choice.objects.create(pk=1, question=question, choice_text="Existing")
+
+    data = [
+        {
+            "model": "polls.Choice",
+            "pk": pk,
+            "fields": {"question": 1, "choice_text": "Imported", "votes": 3},
+        }
+        for pk in (1, 2, 3)
+    ]
+    strategy = QuerySetStrategy(name="default", import_batch_size=2)
+    strategy.import_objects(
+        "default",
+        None,
+        Choice,
+        serializers.deserialize("python", data),
+    )
+
+    assert dict(Choice.objects.values_list("pk", "choice_text")) == {
+        1: "Existing",
+        2: "Imported",
+        3: "Imported",
+    }
+
+
+@pytest.mark.django_db
+def test_export_with_copy_matches_serializer(tmp_path):
+    question = Question.objects.create(
+        pk=1,
+        question_text='Quotes " and \\ backslashes\n',
+        pub_date=datetime.datetime(
+            2021, 1, 2, 3, 4, 5, 6000, tzinfo=datetime.timezone.utc
+        ),
+    )
+    Choice.objects.create(pk=2, question=question, choice_text="ü", votes=4)
+
+    for model in (Question, Choice):
+        exported = {}
+        for export_with_copy in (True, False):
+            strategy = QuerySetStrategy(
+                name="copy-{}".format(export_with_copy),
+                anonymise=False,
+                data_format="jsonl",
+                export_with_copy=export_with_copy,
+            )
+            strategy.export_data("default", tmp_path, model)
+
+            data_file = strategy.data_file(tmp_path, model._meta.label)
+            with data_file.open() as f:
+                exported[export_with_copy] = [
+                    (x.object.pk, model_to_dict(x.object))
+                    for x in serializers.deserialize("jsonl", f)
+                ]
+
+        assert exported[True] == exported[False]
+        assert len(exported[True]) == 1
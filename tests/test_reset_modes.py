@@ -0,0 +1,79 @@
+import datetime
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import override_settings
+from polls.models import Question
+
+from devdata.engine import get_schema_fingerprint, save_schema_fingerprint
+from devdata.manifest import write_manifest
+from devdata.reset_modes import MODES, get_snapshot_fingerprint
+
+
+@pytest.mark.django_db
+def test_truncate_reset(
+    test_data_dir,
+    default_export_data,
+    ensure_migrations_table,
+):
+    Question.objects.create(
+        question_text="Do you like jam?",
+        pub_date=datetime.datetime.now(datetime.timezone.utc),
+    )
+
+    reset_mode = MODES["truncate"]
+    # The schema is only kept if it was imported from the same models.
+    save_schema_fingerprint("default", None)
+    assert not reset_mode.reset_data("default", test_data_dir)
+    save_schema_fingerprint("default", "0" * 64)
+    assert not reset_mode.reset_data("default", test_data_dir)
+
+    save_schema_fingerprint(
+        "default",
+        get_schema_fingerprint("default", []),
+    )
+    assert reset_mode.reset_data("default", test_data_dir)
+
+    assert not Question.objects.exists()
+    # Data created after migrating is recreated.
+    assert ContentType.objects.filter(app_label="polls").exists()
+
+    # The schema is only kept while the migrations match the export's.
+    MigrationRecorder(connections["default"]).record_applied(
+        "fake-app",
+        "0001-fake-migration",
+    )
+    assert not reset_mode.reset_data("default", test_data_dir)
+
+
+def test_snapshot_fingerprint(test_data_dir, default_export_data):
+    write_manifest(test_data_dir)
+    fingerprint = get_snapshot_fingerprint("default", test_data_dir)
+    assert get_snapshot_fingerprint("default", test_data_dir) == fingerprint
+
+    # Changes to the export are detected even if its manifest isn't updated.
+    (test_data_dir / "polls.Question" / "default.json").write_text("[ ]")
+    changed_fingerprint = get_snapshot_fingerprint("default", test_data_dir)
+    assert changed_fingerprint != fingerprint
+
+    # As are changes to the content of existing migrations (which are
+    # otherwise disabled by the test settings).
+    read_bytes = Path.read_bytes
+
+    def edit_migrations(path):
+        content = read_bytes(path)
+        if "migrations" in path.parts:
+            content += b"\n# Edited\n"
+        return content
+
+    with override_settings(MIGRATION_MODULES={}):
+        changed_fingerprint = get_snapshot_fingerprint("default", test_data_dir)
+        with mock.patch.object(Path, "read_bytes", edit_migrations):
+            assert (
+                get_snapshot_fingerprint("default", test_data_dir)
+                != changed_fingerprint
+            )
@@ -0,0 +1,142 @@
+import datetime
+from unittest import mock
+
+import pytest
+from polls.models import Question
+from test_infrastructure import run_command
+
+from devdata.checkpoints import ImportCheckpoint
+from devdata.engine import import_model_strategy
+from devdata.strategies import DeleteFirstQuerySetStrategy, QuerySetStrategy
+
+
+def export_questions(strategy, dest, count):
+    Question.objects.bulk_create(
+        Question(
+            pk=x,
+            question_text=str(x),
+            pub_date=datetime.datetime(
+                2021, 1, 1, tzinfo=datetime.timezone.utc
+            ),
+        )
+        for x in range(1, count + 1)
+    )
+    # Strategy names are only expected to be exported once per process.
+    strategy.seen_names.discard(("polls.Question", strategy.name))
+    strategy.export_data("default", dest, Question)
+    Question.objects.all().delete()
+
+
+def fail_after_batches(strategy_checkpoint, batches):
+    record_rows = strategy_checkpoint.record_rows
+    calls = 0
+
+    def fail(rows):
+        nonlocal calls
+        calls += 1
+        if calls > batches:
+            raise RuntimeError("Interrupted")
+        record_rows(rows)
+
+    return mock.patch.object(strategy_checkpoint, "record_rows", fail)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "strategy_class",
+    [QuerySetStrategy, DeleteFirstQuerySetStrategy],
+)
+def test_resume_import(tmp_path, strategy_class):
+    strategy = strategy_class(
+        name="resume",
+        data_format="jsonl",
+        import_batch_size=2,
+    )
+    export_questions(strategy, tmp_path, 5)
+
+    checkpoint = ImportCheckpoint("default")
+    checkpoint.create()
+    strategy_checkpoint = checkpoint.for_strategy("polls.Question", "resume")
+
+    with fail_after_batches(strategy_checkpoint, 1):
+        with pytest.raises(RuntimeError):
+            strategy.import_data(
+                "default",
+                tmp_path,
+                Question,
+                checkpoint=strategy_checkpoint,
+            )
+
+    # The interrupted batch is rolled back along with its progress.
+    assert list(Question.objects.values_list("pk", flat=True)) == [1, 2]
+    checkpoint.load()
+    assert strategy_checkpoint.rows == 2
+
+    strategy.import_data(
+        "default",
+        tmp_path,
+        Question,
+        checkpoint=strategy_checkpoint,
+    )
+
+    assert sorted(Question.objects.values_list("pk", flat=True)) == [
+        1,
+        2,
+        3,
+        4,
+        5,
+    ]
+    assert strategy_checkpoint.rows == 5
+
+    strategy_checkpoint.mark_complete()
+    checkpoint.load()
+    assert strategy_checkpoint.complete
+
+    checkpoint.delete()
+    assert not checkpoint.exists()
+
+
+@pytest.mark.django_db
+def test_resume_without_checkpoint(test_data_dir):
+    process = run_command("devdata_import", "--resume", test_data_dir)
+    assert process.returncode != 0
+    assert b"no interrupted import to resume" in process.stderr
+
+
+class LegacyImportData(QuerySetStrategy):
+    def import_data(self, django_dbname, src, model):
+        super().import_data(django_dbname, src, model)
+
+
+class LegacyImportObjects(QuerySetStrategy):
+    def import_objects(self, django_dbname, src, model, objects):
+        super().import_objects(django_dbname, src, model, objects)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "strategy_class",
+    [LegacyImportData, LegacyImportObjects],
+)
+def test_overrides_without_checkpoints(tmp_path, strategy_class):
+    strategy = strategy_class(name="legacy", data_format="jsonl")
+    export_questions(strategy, tmp_path, 3)
+
+    checkpoint = ImportCheckpoint("default")
+    checkpoint.create()
+
+    with mock.patch(
+        "devdata.engine.get_strategy_checkpoint_key",
+        return_value="legacy",
+    ):
+        import_model_strategy(
+            "default",
+            tmp_path,
+            "polls.Question",
+            strategy,
+            checkpoint,
+        )
+
+    assert Question.objects.count() == 3
+    checkpoint.load()
+    assert checkpoint.for_strategy("polls.Question", "legacy").complete
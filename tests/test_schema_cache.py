@@ -0,0 +1,51 @@
+import pytest
+from django.test import override_settings
+from polls.models import Question
+
+from devdata import engine
+
+
+@pytest.mark.django_db
+def test_schema_cache(tmp_path, monkeypatch):
+    with override_settings(DEVDATA_SCHEMA_CACHE_DIR=tmp_path):
+        statements = engine.get_schema_sql("default", [])
+        assert any("CREATE TABLE" in x for x in statements)
+
+        with monkeypatch.context() as m:
+            m.setattr(engine, "collect_schema_sql", None)
+            assert engine.get_schema_sql("default", []) == statements
+
+    with override_settings(DEVDATA_SCHEMA_CACHE_DIR=None):
+        assert engine.get_schema_sql("default", []) is None
+
+
+@pytest.mark.django_db
+def test_schema_cache_is_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "SCHEMA_CACHE_SIZE", 2)
+
+    with override_settings(DEVDATA_SCHEMA_CACHE_DIR=tmp_path):
+        for index in range(4):
+            migrations = [{"app": "polls", "name": str(index)}]
+            assert engine.get_schema_sql("default", migrations)
+
+    assert len(list(tmp_path.glob("*.json"))) == 2
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "get_options, name",
+    [
+        (lambda: Question._meta.get_field("question_text"), "db_comment"),
+        (lambda: Question._meta.get_field("question_text"), "db_default"),
+        (lambda: Question._meta, "db_table_comment"),
+    ],
+)
+def test_schema_fingerprint_includes_database_options(
+    monkeypatch, get_options, name
+):
+    if not hasattr(get_options(), name):
+        pytest.skip("{} isn't supported by this version of Django".format(name))
+
+    fingerprint = engine.get_schema_fingerprint("default", [])
+    monkeypatch.setattr(get_options(), name, "Changed")
+    assert engine.get_schema_fingerprint("default", []) != fingerprint
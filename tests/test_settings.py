@@ -0,0 +1,54 @@
+import pytest
+from django.test import override_settings
+
+from devdata.settings import settings
+from devdata.strategies import QuerySetStrategy
+
+
+def test_configuration_is_cached():
+    assert settings.configuration is settings.configuration
+    assert (
+        settings.strategies["polls.Question"][0]
+        is settings.strategies["polls.Question"][0]
+    )
+    assert settings.sorted_strategies is settings.sorted_strategies
+
+
+def test_configuration_is_cleared_when_settings_change():
+    configuration = settings.configuration
+    strategy = QuerySetStrategy(name="other")
+
+    with override_settings(DEVDATA_STRATEGIES={"polls.Question": [strategy]}):
+        assert settings.configuration is not configuration
+        assert settings.strategies["polls.Question"] == (strategy,)
+
+    assert settings.strategies["polls.Question"] != (strategy,)
+
+
+def test_unrelated_settings_do_not_clear_configuration():
+    configuration = settings.configuration
+
+    with override_settings(DEBUG=True):
+        assert settings.configuration is configuration
+
+
+class SettingsReadingStrategy(QuerySetStrategy):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        settings.extra_strategies
+
+
+def test_configuration_accessed_while_loading():
+    with override_settings(
+        DEVDATA_STRATEGIES={
+            "polls.Question": [
+                ("test_settings.SettingsReadingStrategy", {"name": "x"}),
+            ],
+        },
+    ):
+        with pytest.raises(RuntimeError, match="while it was being loaded"):
+            settings.configuration
+
+        # Loading can be retried once the problem is fixed.
+        with override_settings(DEVDATA_STRATEGIES={"polls.Question": []}):
+            assert settings.strategies["polls.Question"] == ()
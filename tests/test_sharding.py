@@ -0,0 +1,113 @@
+import datetime
+
+import pytest
+from django.core import serializers
+from polls.models import Question
+
+from devdata.strategies import QuerySetStrategy
+from devdata.utils import (
+    get_exported_objects_for_model,
+    get_exported_pk_index,
+    iter_exported_objects,
+    read_pk_index,
+    shard_file,
+)
+
+
+def create_questions(count):
+    Question.objects.bulk_create(
+        Question(
+            pk=x,
+            question_text=str(x),
+            pub_date=datetime.datetime(
+                2021, 1, 1, tzinfo=datetime.timezone.utc
+            ),
+        )
+        for x in range(1, count + 1)
+    )
+
+
+def export(strategy, dest):
+    # Strategy names are only expected to be exported once per process.
+    strategy.seen_names.discard(("polls.Question", strategy.name))
+    strategy.export_data("default", dest, Question)
+
+
+def test_shard_file(tmp_path):
+    assert shard_file(tmp_path / "default.jsonl.gz", 3) == (
+        tmp_path / "default.00003.jsonl.gz"
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("data_format", ["json", "jsonl"])
+def test_sharded_export(tmp_path, data_format):
+    create_questions(5)
+
+    strategy = QuerySetStrategy(
+        name="sharded-{}".format(data_format),
+        anonymise=False,
+        data_format=data_format,
+        shard_size=2,
+    )
+    export(strategy, tmp_path)
+
+    data_file = strategy.data_file(tmp_path, "polls.Question")
+    shards = strategy.find_data_files(tmp_path, "polls.Question")
+    assert shards == [shard_file(data_file, x) for x in range(3)]
+    assert [[x["pk"] for x in iter_exported_objects(y)] for y in shards] == [
+        [1, 2],
+        [3, 4],
+        [5],
+    ]
+    assert [list(read_pk_index(x)) for x in shards] == [[1, 2], [3, 4], [5]]
+
+    get_exported_pk_index.cache_clear()
+    get_exported_objects_for_model.cache_clear()
+    assert sorted(get_exported_pk_index(tmp_path, Question)) == [1, 2, 3, 4, 5]
+    assert len(get_exported_objects_for_model(tmp_path, Question)) == 5
+
+    # Shards from a previous export with more rows are removed.
+    Question.objects.filter(pk=5).delete()
+    export(strategy, tmp_path)
+    assert strategy.find_data_files(tmp_path, "polls.Question") == shards[:2]
+
+    # Shards of a previous export are replaced by an unsharded export.
+    strategy.shard_size = None
+    export(strategy, tmp_path)
+    assert strategy.find_data_files(tmp_path, "polls.Question") == [data_file]
+    assert not any(x.exists() or x.with_suffix(".pks").exists() for x in shards)
+
+
+@pytest.mark.django_db
+def test_import_sharded_export(tmp_path):
+    create_questions(5)
+
+    strategy = QuerySetStrategy(
+        name="sharded-import",
+        anonymise=False,
+        data_format="jsonl",
+        shard_size=2,
+    )
+    export(strategy, tmp_path)
+    Question.objects.all().delete()
+
+    strategy.import_data("default", tmp_path, Question)
+
+    assert sorted(Question.objects.values_list("pk", flat=True)) == [
+        1,
+        2,
+        3,
+        4,
+        5,
+    ]
+
+
+@pytest.mark.django_db
+def test_empty_sharded_export(tmp_path):
+    strategy = QuerySetStrategy(name="sharded-empty", shard_size=2)
+    export(strategy, tmp_path)
+
+    (shard,) = strategy.find_data_files(tmp_path, "polls.Question")
+    assert shard.name == "sharded-empty.00000.json"
+    assert list(serializers.deserialize("json", shard.read_text())) == []
@@ -2,6 +2,8 @@
 devdata settings for tests.
 """
 
+import os
+
 from devdata.strategies import (
     ExactQuerySetStrategy,
     LatestSampleQuerySetStrategy,
@@ -18,6 +20,10 @@ DEVDATA_DEFAULT_STRATEGY = QuerySetStrategy(name="default")
 
 DEVDATA_FAKER_LOCALES = ["en_GB", "de"]
 
+# Keep the schema cache out of the user's cache directory, tests set their own
+# location (or disable it when not set).
+DEVDATA_SCHEMA_CACHE_DIR = os.environ.get("DEVDATA_SCHEMA_CACHE_DIR")
+
 DEVDATA_STRATEGIES = {
     ###
     # Important: If updating behaviour here, remember to update
@@ -38,7 +44,7 @@ DEVDATA_STRATEGIES = {
     "contenttypes.ContentType": [
         (
             "devdata.strategies.DeleteFirstQuerySetStrategy",
-            {"name": "replaced"},
+            {"name": "replaced", "fast_delete": True},
         ),
     ],
     "auth.Permission": [
@@ -52,16 +58,24 @@ DEVDATA_STRATEGIES = {
     # of them, and they pose a security risk if not correctly anonymised.
     "sessions.Session": [],
     ###
-    # Polls is a very basic import/export example. We leave these to the default
-    # strategy.
-    # polls.Question
+    # Polls is a very basic import/export example. We leave choices to the
+    # default strategy, while questions have no personal data and so are
+    # exported directly from the database.
+    "polls.Question": [
+        QuerySetStrategy(
+            name="default",
+            anonymise=False,
+            data_format="jsonl",
+            export_with_copy=True,
+        ),
+    ],
     # polls.Choice
     ###
     # Photofeed is used to demonstrate restricted exports and anonymising of
     # user data. In particular, we customise the users exported to restrict the
     # photos and likes exported.
     "photofeed.Photo": [
-        QuerySetStrategy(name="default"),
+        QuerySetStrategy(name="default", data_format="jsonl"),
     ],
     "photofeed.Like": [
         LatestSampleQuerySetStrategy(